@@ -0,0 +1,168 @@
+import asyncio
+import math
+import random
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from fastapi import HTTPException, status
+from fastapi.responses import ORJSONResponse
+from Utils.Config import RETRY_AFTER_JITTER
+from Utils.Metrics import ADMISSION_ACTIVE, ADMISSION_QUEUE_DEPTH, ADMISSION_REJECTIONS, ADMISSION_WAIT
+
+
+def retry_after(base: float) -> str:
+    """
+    Retry-After value with random jitter, so rejected clients do not all come
+    back in the same second and recreate the surge.
+    """
+    return str(max(1, math.ceil(base)) + random.randint(0, RETRY_AFTER_JITTER))
+
+
+class Rejected(HTTPException):
+    """
+    429 raised when a gate or rate limit turns a request away.
+    """
+
+    def __init__(self, detail: str, base_retry_after: float):
+        super().__init__(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=detail,
+            headers={"Retry-After": retry_after(base_retry_after)},
+        )
+
+
+class Gate:
+    """
+    Concurrency limit with a bounded, deadline-aware FIFO wait queue.
+
+    Up to `limit` holders run at once. Further callers wait in line, at most
+    `queue_size` of them and each for at most `timeout` seconds; anyone beyond
+    that is rejected straight away with a 429 rather than waiting for a slot
+    that would arrive too late to be useful. A released slot is handed to the
+    oldest waiter directly, so waiters are served in arrival order.
+
+    Gates live on one event loop and are only touched from it, so the counters
+    need no lock.
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int, timeout: float, retry_after: float = 1):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self._waiters = deque()
+        ADMISSION_ACTIVE.labels(name).set_function(lambda: self.active)
+        ADMISSION_QUEUE_DEPTH.labels(name).set_function(lambda: len(self._waiters))
+
+    def _reject(self, reason: str):
+        ADMISSION_REJECTIONS.labels(self.name, reason).inc()
+        raise Rejected(f"The server is busy ({self.name}). Please retry shortly.", self.retry_after)
+
+    async def acquire(self):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        if len(self._waiters) >= self.queue_size:
+            self._reject("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            granted = waiter.done() and not waiter.cancelled()
+            if not granted:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                if granted:
+                    self.release()
+                raise
+            if not granted:
+                self._reject("timeout")
+        ADMISSION_WAIT.labels(self.name).observe(time.perf_counter() - started)
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # The slot passes straight to the waiter; `active` is unchanged.
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class TokenBucket:
+    """
+    Per-key token bucket rate limiter.
+
+    Each key (a user ID) may make `burst` requests at once and then `rate`
+    requests per second. Buckets are kept for the most recently seen
+    `max_keys` keys only; an evicted key simply starts again with a full bucket.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int, max_keys: int = 100000):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+
+    def check(self, key: str):
+        """
+        Take one token for `key`, raising a 429 when its bucket is empty.
+        """
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            ADMISSION_REJECTIONS.labels(self.name, "rate_limited").inc()
+            raise Rejected("Too many requests. Please slow down.", (1 - tokens) / self.rate)
+        self._buckets[key] = (tokens - 1, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware holding a gate slot for the whole of selected requests.
+
+    `routes` maps `(method, path)` to a `Gate`. The slot is taken before the
+    request body is read, so a request turned away during a surge never
+    uploads its photo, and it is held until the response has been sent.
+    """
+
+    def __init__(self, app, routes: dict):
+        self.app = app
+        self.routes = routes
+
+    async def __call__(self, scope, receive, send):
+        gate = None
+        if scope["type"] == "http":
+            gate = self.routes.get((scope["method"], scope["path"]))
+        if gate is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await gate.acquire()
+        except HTTPException as e:
+            response = ORJSONResponse({"detail": e.detail}, status_code=e.status_code, headers=e.headers)
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release()
+
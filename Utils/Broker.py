@@ -0,0 +1,98 @@
+import asyncio
+from typing import Optional
+from Utils.Admission import Rejected
+from Utils.Metrics import BROKER_DELIVERIES, BROKER_SUBSCRIBERS
+
+# Put in a dropped subscriber's buffer in place of the events it missed.
+DROPPED = object()
+
+
+class Subscription:
+    """
+    One subscriber's bounded buffer of messages on a topic.
+    """
+
+    __slots__ = ("topic", "_queue")
+
+    def __init__(self, topic: str, buffer_size: int):
+        self.topic = topic
+        self._queue = asyncio.Queue(buffer_size)
+
+    async def get(self, timeout: float):
+        """
+        Wait up to `timeout` seconds for the next message; None on timeout,
+        `DROPPED` once the subscriber has been cut off for falling behind.
+        """
+        if not self._queue.empty():
+            return self._queue.get_nowait()
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class Broker:
+    """
+    In-process publish/subscribe with a bounded buffer per subscriber.
+
+    `publish` never waits: it puts the message in every subscriber's buffer
+    and drops any subscriber whose buffer is full, replacing its backlog with
+    `DROPPED` so it can tell its client to resync, rather than let one slow
+    consumer hold up the publisher or grow without bound. An idle subscriber
+    costs one empty queue. Messages are published as they will be sent, so a
+    message is encoded once however many subscribers receive it.
+
+    Subscribers only see messages published by their own worker process; the
+    broker lives on one event loop and needs no lock.
+    """
+
+    def __init__(self, name: str, buffer_size: int, max_subscribers: int, retry_after: float = 1):
+        self.name = name
+        self.buffer_size = buffer_size
+        self.max_subscribers = max_subscribers
+        self.retry_after = retry_after
+        self.subscribers = 0
+        self._topics = {}
+        BROKER_SUBSCRIBERS.labels(name).set_function(lambda: self.subscribers)
+
+    def subscribe(self, topic: str) -> Subscription:
+        """
+        Subscribe to a topic, or raise a 429 when the broker is at capacity.
+        """
+        if self.subscribers >= self.max_subscribers:
+            raise Rejected(f"Too many open subscriptions ({self.name}). Please retry shortly.", self.retry_after)
+        subscription = Subscription(topic, self.buffer_size)
+        self._topics.setdefault(topic, set()).add(subscription)
+        self.subscribers += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._topics.get(subscription.topic)
+        if subscribers is None or subscription not in subscribers:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._topics[subscription.topic]
+        self.subscribers -= 1
+
+    def publish(self, topic: Optional[str], message) -> int:
+        """
+        Deliver a message to a topic's subscribers. Returns how many received it.
+        """
+        subscribers = self._topics.get(topic)
+        if not subscribers:
+            return 0
+        delivered = 0
+        for subscription in list(subscribers):
+            queue = subscription._queue
+            try:
+                queue.put_nowait(message)
+                delivered += 1
+            except asyncio.QueueFull:
+                self.unsubscribe(subscription)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(DROPPED)
+                BROKER_DELIVERIES.labels(self.name, "dropped").inc()
+        BROKER_DELIVERIES.labels(self.name, "delivered").inc(delivered)
+        return delivered
@@ -1,28 +1,150 @@
 from dotenv import load_dotenv
 import os
-from pathlib import Path  
-import boto3  
+from pathlib import Path
 
-env_path = Path('Utils/.env')
+# Settings are read from the environment (falling back to Utils/.env, found
+# relative to this file rather than the working directory) and validated once
+# per process when this module is imported. Clients built from them (MongoDB,
+# S3) are created lazily per worker process; see database_connection.connect
+# and Storage.get_s3_client.
+env_path = Path(__file__).resolve().parent / '.env'
 load_dotenv(dotenv_path=env_path)
-database_url = os.getenv('DATABASE_URL')
-user_collection_name = os.getenv("USER_COLLECTION")
-attendance_collection_name = os.getenv("ATTENDANCE_COLLECTION")
-database_name = os.getenv("DATABASE_NAME")
-shift_collection_name = os.getenv("SHIFT_COLLECTION")
-PRIVATE_KEY = os.getenv("PRIVATE_KEY").encode('utf-8')
-PUBLIC_KEY = os.getenv("PUBLIC_KEY").encode('utf-8')
-TOKEN_EXPIRE_TIME = int(os.getenv("TOKEN_EXPIRE_TIME"))
-MANAGER_SECRET_KEY = os.getenv("MANAGER_SECRET_KEY")
-AWS_ACCESS_KEY_ID= os.getenv("AWS_ACCESS_KEY_ID")
-AWS_SECRET_ACCESS_KEY= os.getenv("AWS_SECRET_ACCESS_KEY")
-AWS_S3_BUCKET_NAME=os.getenv("AWS_S3_BUCKET_NAME")
-AWS_REGION=os.getenv("AWS_REGION")
-
-s3_client = boto3.client(
-    's3',
-    region_name=AWS_REGION,
-    aws_access_key_id=AWS_ACCESS_KEY_ID,
-    aws_secret_access_key=AWS_SECRET_ACCESS_KEY
+
+_REQUIRED = object()
+_errors = []
+
+
+def _env(name: str, cast=str, default=_REQUIRED):
+    """
+    Read one setting, recording (rather than raising) a missing or malformed value.
+    """
+    value = os.getenv(name)
+    if value is None or value == "":
+        if default is _REQUIRED:
+            _errors.append(f"{name} is required")
+            return cast()
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        _errors.append(f"{name} must be {cast.__name__}, got {value!r}")
+        return cast()
+
+
+def _check(condition: bool, message: str):
+    if not condition:
+        _errors.append(message)
+
+
+database_url = _env("DATABASE_URL")
+user_collection_name = _env("USER_COLLECTION")
+attendance_collection_name = _env("ATTENDANCE_COLLECTION")
+attendance_bucket_collection_name = _env("ATTENDANCE_BUCKET_COLLECTION", default="attendance_buckets")
+database_name = _env("DATABASE_NAME")
+shift_collection_name = _env("SHIFT_COLLECTION")
+rollup_collection_name = _env("ROLLUP_COLLECTION", default="attendance_rollups")
+idempotency_collection_name = _env("IDEMPOTENCY_COLLECTION", default="idempotency_keys")
+outbox_collection_name = _env("OUTBOX_COLLECTION", default="outbox")
+MONGO_MAX_POOL_SIZE = _env("MONGO_MAX_POOL_SIZE", int, 100)
+MONGO_MIN_POOL_SIZE = _env("MONGO_MIN_POOL_SIZE", int, 10)
+MONGO_MAX_IDLE_TIME_MS = _env("MONGO_MAX_IDLE_TIME_MS", int, 60000)
+MONGO_WAIT_QUEUE_TIMEOUT_MS = _env("MONGO_WAIT_QUEUE_TIMEOUT_MS", int, 2000)
+MONGO_CONNECT_TIMEOUT_MS = _env("MONGO_CONNECT_TIMEOUT_MS", int, 5000)
+MONGO_SOCKET_TIMEOUT_MS = _env("MONGO_SOCKET_TIMEOUT_MS", int, 10000)
+MONGO_SERVER_SELECTION_TIMEOUT_MS = _env("MONGO_SERVER_SELECTION_TIMEOUT_MS", int, 5000)
+MONGO_READ_PREFERENCE = _env("MONGO_READ_PREFERENCE", default="primaryPreferred")
+PRIVATE_KEY = _env("PRIVATE_KEY").encode('utf-8')
+PUBLIC_KEY = _env("PUBLIC_KEY").encode('utf-8')
+TOKEN_EXPIRE_TIME = _env("TOKEN_EXPIRE_TIME", int)
+MANAGER_SECRET_KEY = _env("MANAGER_SECRET_KEY")
+PRINCIPAL_CACHE_SIZE = _env("PRINCIPAL_CACHE_SIZE", int, 10000)
+PRINCIPAL_CACHE_TTL = _env("PRINCIPAL_CACHE_TTL", int, 60)
+BCRYPT_ROUNDS = _env("BCRYPT_ROUNDS", int, 12)
+PASSWORD_HASH_EXECUTOR = _env("PASSWORD_HASH_EXECUTOR", default="thread")
+PASSWORD_HASH_WORKERS = _env("PASSWORD_HASH_WORKERS", int, os.cpu_count() or 1)
+PASSWORD_HASH_QUEUE_SIZE = _env("PASSWORD_HASH_QUEUE_SIZE", int, 64)
+PASSWORD_HASH_QUEUE_TIMEOUT = _env("PASSWORD_HASH_QUEUE_TIMEOUT", float, 5)
+PASSWORD_HASH_RETRY_AFTER = _env("PASSWORD_HASH_RETRY_AFTER", int, 1)
+BULK_HASH_WORKERS = _env("BULK_HASH_WORKERS", int, os.cpu_count() or 1)
+BULK_REGISTER_MAX_ROWS = _env("BULK_REGISTER_MAX_ROWS", int, 5000)
+# Without explicit keys or region boto3 uses its default chain (instance or
+# task role, shared config, AWS_DEFAULT_REGION).
+AWS_ACCESS_KEY_ID = _env("AWS_ACCESS_KEY_ID", default=None)
+AWS_SECRET_ACCESS_KEY = _env("AWS_SECRET_ACCESS_KEY", default=None)
+AWS_S3_BUCKET_NAME = _env("AWS_S3_BUCKET_NAME")
+AWS_REGION = _env("AWS_REGION", default=None)
+S3_ENDPOINT_URL = _env("S3_ENDPOINT_URL", default=None) or None
+S3_UPLOAD_CONCURRENCY = _env("S3_UPLOAD_CONCURRENCY", int, 16)
+S3_UPLOAD_QUEUE_SIZE = _env("S3_UPLOAD_QUEUE_SIZE", int, 1024)
+S3_UPLOAD_QUEUE_TIMEOUT = _env("S3_UPLOAD_QUEUE_TIMEOUT", float, 30)
+S3_UPLOAD_PART_SIZE = _env("S3_UPLOAD_PART_SIZE", int, 8 * 1024 * 1024)
+S3_UPLOAD_READ_SIZE = _env("S3_UPLOAD_READ_SIZE", int, 256 * 1024)
+IMAGE_MAX_UPLOAD_BYTES = _env("IMAGE_MAX_UPLOAD_BYTES", int, 15 * 1024 * 1024)
+IMAGE_MAX_DIMENSION = _env("IMAGE_MAX_DIMENSION", int, 1280)
+IMAGE_FORMAT = _env("IMAGE_FORMAT", default="WEBP").upper()
+IMAGE_QUALITY = _env("IMAGE_QUALITY", int, 80)
+IMAGE_EXECUTOR = _env("IMAGE_EXECUTOR", default="thread")
+IMAGE_WORKERS = _env("IMAGE_WORKERS", int, os.cpu_count() or 1)
+PRESIGNED_UPLOAD_EXPIRES = _env("PRESIGNED_UPLOAD_EXPIRES", int, 300)
+ATTENDANCE_BATCH_MAX_PUNCHES = _env("ATTENDANCE_BATCH_MAX_PUNCHES", int, 500)
+# How far back a replayed batch punch may be, in seconds.
+ATTENDANCE_BATCH_MAX_AGE = _env("ATTENDANCE_BATCH_MAX_AGE", int, 24 * 60 * 60)
+REPORT_CURSOR_BATCH_SIZE = _env("REPORT_CURSOR_BATCH_SIZE", int, 500)
+REPORT_STREAM_CHUNK_SIZE = _env("REPORT_STREAM_CHUNK_SIZE", int, 64 * 1024)
+LATE_GRACE_MINUTES = _env("LATE_GRACE_MINUTES", int, 0)
+CLOCK_OUT_MAX_HOURS = _env("CLOCK_OUT_MAX_HOURS", float, 16)
+PAYROLL_CHUNK_SIZE = _env("PAYROLL_CHUNK_SIZE", int, 2000)
+SHIFT_CACHE_SIZE = _env("SHIFT_CACHE_SIZE", int, 10000)
+SHIFT_CACHE_TTL = _env("SHIFT_CACHE_TTL", int, 60)
+ATTENDANCE_CONCURRENCY = _env("ATTENDANCE_CONCURRENCY", int, 64)
+ATTENDANCE_QUEUE_SIZE = _env("ATTENDANCE_QUEUE_SIZE", int, 512)
+ATTENDANCE_QUEUE_TIMEOUT = _env("ATTENDANCE_QUEUE_TIMEOUT", float, 10)
+ATTENDANCE_DB_CONCURRENCY = _env("ATTENDANCE_DB_CONCURRENCY", int, 32)
+ATTENDANCE_DB_QUEUE_SIZE = _env("ATTENDANCE_DB_QUEUE_SIZE", int, 1024)
+ATTENDANCE_DB_QUEUE_TIMEOUT = _env("ATTENDANCE_DB_QUEUE_TIMEOUT", float, 5)
+ADMISSION_RETRY_AFTER = _env("ADMISSION_RETRY_AFTER", int, 1)
+RETRY_AFTER_JITTER = _env("RETRY_AFTER_JITTER", int, 2)
+USER_RATE_LIMIT = _env("USER_RATE_LIMIT", float, 0)
+USER_RATE_BURST = _env("USER_RATE_BURST", int, 5)
+IDEMPOTENCY_TTL = _env("IDEMPOTENCY_TTL", int, 24 * 60 * 60)
+IDEMPOTENCY_WAIT_SECONDS = _env("IDEMPOTENCY_WAIT_SECONDS", float, 10)
+IDEMPOTENCY_LOCK_TIMEOUT = _env("IDEMPOTENCY_LOCK_TIMEOUT", int, 120)
+OUTBOX_WORKERS = _env("OUTBOX_WORKERS", int, 4)
+OUTBOX_MAX_ATTEMPTS = _env("OUTBOX_MAX_ATTEMPTS", int, 6)
+OUTBOX_BACKOFF_BASE = _env("OUTBOX_BACKOFF_BASE", float, 2)
+OUTBOX_BACKOFF_MAX = _env("OUTBOX_BACKOFF_MAX", float, 300)
+OUTBOX_LEASE_SECONDS = _env("OUTBOX_LEASE_SECONDS", int, 300)
+OUTBOX_HANDOFF_SECONDS = _env("OUTBOX_HANDOFF_SECONDS", int, 30)
+OUTBOX_POLL_INTERVAL = _env("OUTBOX_POLL_INTERVAL", float, 1)
+OUTBOX_METRICS_INTERVAL = _env("OUTBOX_METRICS_INTERVAL", float, 15)
+FEED_BUFFER_SIZE = _env("FEED_BUFFER_SIZE", int, 64)
+FEED_MAX_SUBSCRIBERS = _env("FEED_MAX_SUBSCRIBERS", int, 10000)
+FEED_HEARTBEAT_SECONDS = _env("FEED_HEARTBEAT_SECONDS", float, 15)
+CLIENT_CACHE_MAX_AGE = _env("CLIENT_CACHE_MAX_AGE", int, 0)
+LOG_LEVEL = _env("LOG_LEVEL", default="INFO").upper()
+EVENT_LOOP_LAG_INTERVAL = _env("EVENT_LOOP_LAG_INTERVAL", float, 0.5)
+bucket_name = AWS_S3_BUCKET_NAME
+
+_check(PASSWORD_HASH_EXECUTOR in ("thread", "process"), "PASSWORD_HASH_EXECUTOR must be 'thread' or 'process'")
+_check(IMAGE_EXECUTOR in ("thread", "process"), "IMAGE_EXECUTOR must be 'thread' or 'process'")
+_check(IMAGE_FORMAT in ("WEBP", "JPEG", "PNG"), "IMAGE_FORMAT must be WEBP, JPEG or PNG")
+_check(
+    MONGO_READ_PREFERENCE in ("primary", "primaryPreferred", "secondary", "secondaryPreferred", "nearest"),
+    "MONGO_READ_PREFERENCE is not a valid read preference",
 )
-bucket_name = AWS_S3_BUCKET_NAME    
+_check(LOG_LEVEL in ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"), "LOG_LEVEL is not a valid log level")
+_check(ATTENDANCE_BATCH_MAX_AGE >= 0, "ATTENDANCE_BATCH_MAX_AGE must not be negative")
+_check(USER_RATE_LIMIT >= 0, "USER_RATE_LIMIT must not be negative")
+_check(
+    (AWS_ACCESS_KEY_ID is None) == (AWS_SECRET_ACCESS_KEY is None),
+    "AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY must be set together",
+)
+_check(S3_UPLOAD_PART_SIZE >= 5 * 1024 * 1024, "S3_UPLOAD_PART_SIZE must be at least 5 MiB")
+_check(OUTBOX_WORKERS >= 1, "OUTBOX_WORKERS must be at least 1")
+_check(OUTBOX_MAX_ATTEMPTS >= 1, "OUTBOX_MAX_ATTEMPTS must be at least 1")
+_check(CLIENT_CACHE_MAX_AGE >= 0, "CLIENT_CACHE_MAX_AGE must not be negative")
+_check(FEED_BUFFER_SIZE >= 1, "FEED_BUFFER_SIZE must be at least 1")
+_check(MONGO_MIN_POOL_SIZE <= MONGO_MAX_POOL_SIZE, "MONGO_MIN_POOL_SIZE must not exceed MONGO_MAX_POOL_SIZE")
+
+if _errors:
+    raise RuntimeError("Invalid configuration: " + "; ".join(_errors))
@@ -0,0 +1,67 @@
+import hashlib
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional
+from fastapi import Request, Response, status
+from Utils.Config import CLIENT_CACHE_MAX_AGE
+
+
+def make_etag(*parts) -> str:
+    """
+    Strong ETag for the representation identified by `parts` (its owner and
+    version fields), without serializing the representation itself.
+    """
+    digest = hashlib.blake2b("\x1f".join(map(str, parts)).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def cache_headers(etag: str, last_modified=None) -> dict:
+    """
+    Validator and caching headers for a per-user response.
+
+    The response depends on the bearer token, so it may only be kept by the
+    client (`private`) and is keyed on Authorization; after
+    `CLIENT_CACHE_MAX_AGE` seconds the client revalidates with If-None-Match.
+    """
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={CLIENT_CACHE_MAX_AGE}",
+        "Vary": "Authorization",
+    }
+    if isinstance(last_modified, (int, float)):
+        headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+    return headers
+
+
+def has_validators(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def is_fresh(request: Request, etag: str, last_modified=None) -> bool:
+    """
+    Whether the client's cached copy is current.
+
+    If-None-Match uses weak comparison and takes precedence; If-Modified-Since
+    is only consulted without it, at the one-second resolution of Last-Modified.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        return etag in {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and isinstance(last_modified, (int, float)):
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified) <= since
+    return False
+
+
+def not_modified(request: Request, etag: str, last_modified=None) -> Optional[Response]:
+    """
+    An empty 304 response when the client's copy is current, otherwise None.
+    """
+    if not is_fresh(request, etag, last_modified):
+        return None
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cache_headers(etag, last_modified))
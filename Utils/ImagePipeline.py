@@ -0,0 +1,208 @@
+import asyncio
+import hashlib
+import io
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from fastapi import HTTPException, status
+from PIL import Image, ImageOps, UnidentifiedImageError
+from Utils.Config import (
+    IMAGE_MAX_UPLOAD_BYTES,
+    IMAGE_MAX_DIMENSION,
+    IMAGE_FORMAT,
+    IMAGE_QUALITY,
+    IMAGE_EXECUTOR,
+    IMAGE_WORKERS,
+)
+from Utils.Storage import upload_bytes, object_exists, iter_upload_file
+from Utils.Metrics import IMAGE_ORIGINAL_BYTES, IMAGE_STORED_BYTES, IMAGE_STAGE_DURATION
+
+# Raw uploads waiting for a background task to process them. Each one is
+# deleted once its image is stored; a bucket lifecycle rule on this prefix
+# should expire any left behind, well after dead-lettered tasks are triaged.
+STAGING_PREFIX = "attendance_staging/"
+
+CONTENT_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg", "PNG": "image/png"}
+EXTENSIONS = {"WEBP": "webp", "JPEG": "jpg", "PNG": "png"}
+
+# Created on first use in each worker process and released by `shutdown()`.
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        if IMAGE_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="image")
+    return _executor
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _observe(timings: dict):
+    for stage, seconds in timings.items():
+        IMAGE_STAGE_DURATION.labels(stage.removeprefix("image-")).observe(seconds)
+
+
+def image_key(digest: str) -> str:
+    """
+    Content-addressed object key for a processed attendance image.
+    """
+    return f"attendance_images/{digest}.{EXTENSIONS.get(IMAGE_FORMAT, IMAGE_FORMAT.lower())}"
+
+
+async def stage_image(data: bytes) -> dict:
+    """
+    Upload raw image bytes under a fresh private staging key, for
+    `store_image_data` to pick up later. Returns the key and upload seconds.
+    """
+    key = f"{STAGING_PREFIX}{uuid.uuid4().hex}"
+    result = await upload_bytes(data, key, content_type="application/octet-stream")
+    return {"key": key, "seconds": result["seconds"]}
+
+
+def _process(data: bytes) -> bytes:
+    """
+    Validate, orient, downscale and re-encode an image. Runs on the worker pool.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.load()
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            image.thumbnail((IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION))
+            output = io.BytesIO()
+            image.save(output, format=IMAGE_FORMAT, quality=IMAGE_QUALITY)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError):
+        raise ValueError("The uploaded file is not a valid image.")
+    return output.getvalue()
+
+
+async def read_image(upload) -> bytes:
+    """
+    Read an uploaded image into memory, rejecting anything over `IMAGE_MAX_UPLOAD_BYTES`.
+    """
+    data = bytearray()
+    async for chunk in iter_upload_file(upload):
+        data += chunk
+        if len(data) > IMAGE_MAX_UPLOAD_BYTES:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Image must not exceed {IMAGE_MAX_UPLOAD_BYTES} bytes."
+            )
+    return bytes(data)
+
+
+def _inspect(data: bytes) -> str:
+    """
+    Check that the data opens as an image and return its content hash.
+
+    Only the image header is parsed; a file that is corrupt further in is
+    caught when `_process` decodes it. Runs on the worker pool.
+    """
+    try:
+        with Image.open(io.BytesIO(data)):
+            pass
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError):
+        raise ValueError("The uploaded file is not a valid image.")
+    return content_hash(data)
+
+
+async def accept_image(upload) -> dict:
+    """
+    Read an uploaded image and work out its object key, without storing it.
+
+    The header is checked so anything that is not an image is rejected with a
+    422 error up front. Returns the raw bytes, the content-addressed key and
+    the seconds spent per stage; `store_image_data` does the rest later.
+    """
+    loop = asyncio.get_running_loop()
+    timings = {}
+
+    started = time.perf_counter()
+    data = await read_image(upload)
+    timings["image-read"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    try:
+        digest = await loop.run_in_executor(_get_executor(), _inspect, data)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    timings["image-hash"] = time.perf_counter() - started
+    _observe(timings)
+    return {"data": data, "key": image_key(digest), "timings": timings}
+
+
+async def store_image_data(data: bytes, key: str, extra_args: dict = None) -> dict:
+    """
+    Process image bytes and upload them under `key`, unless the object exists.
+
+    The key is derived from the original bytes, so a retried or duplicate
+    upload finds the existing object and skips processing and upload
+    entirely. Raises ValueError for data that does not decode as an image.
+    Returns whether the object was deduplicated, the stored size and the
+    seconds spent per stage, which are also recorded as metrics.
+    """
+    loop = asyncio.get_running_loop()
+    timings = {}
+
+    started = time.perf_counter()
+    exists = await object_exists(key)
+    timings["image-exists"] = time.perf_counter() - started
+    result = {"deduplicated": exists, "stored_bytes": 0, "timings": timings}
+    if exists:
+        _observe(timings)
+        IMAGE_ORIGINAL_BYTES.labels("deduplicated").inc(len(data))
+        return result
+
+    started = time.perf_counter()
+    processed = await loop.run_in_executor(_get_executor(), _process, data)
+    timings["image-process"] = time.perf_counter() - started
+    _observe(timings)
+
+    upload_result = await upload_bytes(
+        processed, key,
+        content_type=CONTENT_TYPES.get(IMAGE_FORMAT, "application/octet-stream"),
+        extra_args=extra_args,
+    )
+    timings["s3-upload"] = upload_result["seconds"]
+    result["stored_bytes"] = len(processed)
+    IMAGE_ORIGINAL_BYTES.labels("processed").inc(len(data))
+    IMAGE_STORED_BYTES.inc(len(processed))
+    return result
+
+
+async def store_image(upload, extra_args: dict = None) -> dict:
+    """
+    Preprocess an uploaded image and store it, skipping work for duplicates.
+
+    Stages: read (bounded by `IMAGE_MAX_UPLOAD_BYTES`), hash, existence check,
+    validate/downscale/re-encode and upload; see `accept_image` and
+    `store_image_data`. CPU-bound stages run on the worker pool. Returns the
+    key, original and stored sizes, whether the object was deduplicated and
+    the seconds spent per stage.
+    """
+    accepted = await accept_image(upload)
+    try:
+        stored = await store_image_data(accepted["data"], accepted["key"], extra_args)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    return {
+        "key": accepted["key"],
+        "original_bytes": len(accepted["data"]),
+        "stored_bytes": stored["stored_bytes"],
+        "deduplicated": stored["deduplicated"],
+        "timings": {**accepted["timings"], **stored["timings"]},
+    }
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
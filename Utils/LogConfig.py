@@ -0,0 +1,67 @@
+import json
+import logging
+import queue
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from Utils.Config import LOG_LEVEL
+
+# Attributes every LogRecord has; anything else on a record came from `extra=`
+# and is written out as a field of the JSON line.
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format a record as one JSON object per line.
+
+    Fields passed with `extra=` are included next to the standard ones, so
+    `logger.info("Shift saved", extra={"staff_id": staff_id})` can be searched
+    by `staff_id` without parsing the message.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S%z"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def setup_logging():
+    """
+    Route the `attendance` loggers through a queue to a background writer.
+
+    Request handlers only put records on an in-memory queue; formatting and the
+    write to stderr happen on the listener's thread, so logging never blocks
+    the event loop on I/O. The level comes from `LOG_LEVEL`. Called once per
+    worker from the app lifespan; `stop_logging()` flushes the queue.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    records = queue.SimpleQueue()
+    stream = logging.StreamHandler(sys.stderr)
+    stream.setFormatter(JsonFormatter())
+    _listener = QueueListener(records, stream, respect_handler_level=True)
+    _listener.start()
+
+    logger = logging.getLogger("attendance")
+    logger.handlers = [QueueHandler(records)]
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+
+
+def stop_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,227 @@
+import asyncio
+import time
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, REGISTRY
+from pymongo import monitoring
+from starlette.routing import Match
+from Utils.Config import EVENT_LOOP_LAG_INTERVAL
+from Utils.PrincipalCache import principal_cache
+
+# Metrics are kept per worker process; scrape every worker (or put a
+# per-worker port behind the scraper) when running with several workers.
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving a request to sending the last byte of its response.",
+    ["method", "route", "status"],
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Requests currently being handled.",
+    ["method", "route"],
+)
+MONGO_COMMAND_LATENCY = Histogram(
+    "mongodb_command_duration_seconds",
+    "Round trip time of MongoDB commands as reported by the driver.",
+    ["command", "collection", "outcome"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+S3_UPLOAD_LATENCY = Histogram(
+    "s3_upload_duration_seconds",
+    "Time to stream one object to S3, including reading its body from the client.",
+    ["method"],
+)
+S3_UPLOAD_BYTES = Counter(
+    "s3_upload_bytes",
+    "Bytes uploaded to S3.",
+    ["method"],
+)
+IMAGE_ORIGINAL_BYTES = Counter(
+    "image_original_bytes",
+    "Bytes of attendance images as uploaded, by whether they were processed or already stored (deduplicated).",
+    ["outcome"],
+)
+IMAGE_STORED_BYTES = Counter(
+    "image_stored_bytes",
+    "Bytes of processed attendance images written to S3; original minus stored is the saving.",
+)
+IMAGE_STAGE_DURATION = Histogram(
+    "image_stage_duration_seconds",
+    "Time spent in one stage of the attendance image pipeline (read, hash, exists, process).",
+    ["stage"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+PASSWORD_HASH_LATENCY = Histogram(
+    "password_hash_duration_seconds",
+    "Time for a bcrypt job, including time queued for a worker.",
+    ["operation"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 2.5, 5, 10, 30),
+)
+ADMISSION_ACTIVE = Gauge(
+    "admission_active",
+    "Requests or jobs currently holding a slot of an admission gate.",
+    ["gate"],
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "admission_queue_depth",
+    "Requests or jobs waiting for a slot of an admission gate.",
+    ["gate"],
+)
+ADMISSION_REJECTIONS = Counter(
+    "admission_rejections",
+    "Requests turned away with a 429, by gate (or rate limit) and reason.",
+    ["gate", "reason"],
+)
+ADMISSION_WAIT = Histogram(
+    "admission_wait_seconds",
+    "Time queued requests waited before getting a slot.",
+    ["gate"],
+)
+OUTBOX_TASKS = Gauge(
+    "outbox_tasks",
+    "Background tasks in the outbox by status (queued, running, dead), sampled periodically.",
+    ["status"],
+)
+OUTBOX_TASK_DURATION = Histogram(
+    "outbox_task_duration_seconds",
+    "Time to run one attempt of a background task, by task type and outcome (done, retry, dead).",
+    ["task", "outcome"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+OUTBOX_TASK_LAG = Histogram(
+    "outbox_task_lag_seconds",
+    "Time from enqueueing a background task to its completion, retries included.",
+    ["task"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900),
+)
+BROKER_SUBSCRIBERS = Gauge(
+    "broker_subscribers",
+    "Open subscriptions to an in-process broker, such as the attendance feed.",
+    ["broker"],
+)
+BROKER_DELIVERIES = Counter(
+    "broker_deliveries",
+    "Messages put in subscriber buffers (delivered) and subscribers cut off for a full buffer (dropped).",
+    ["broker", "outcome"],
+)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop ran a timer that was due; high values mean blocking code.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+
+
+def route_label(app, scope) -> str:
+    """
+    Return the route template a request matches, e.g. `/api/v1/shift/{staff_id}`.
+
+    Labelling by template rather than raw path keeps the number of series
+    bounded no matter how many IDs appear in URLs.
+    """
+    partial = None
+    for route in app.router.routes:
+        path = getattr(route, "path", None)
+        if path is None:
+            continue
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return path
+        if match == Match.PARTIAL and partial is None:
+            partial = path
+    return partial or "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency and in-flight requests per route.
+
+    Written as plain ASGI rather than `BaseHTTPMiddleware` so streamed
+    responses pass straight through and the latency covers the whole body.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = route_label(scope["app"], scope)
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_flight = REQUESTS_IN_FLIGHT.labels(method, route)
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            REQUEST_LATENCY.labels(method, route, str(status_code)).observe(time.perf_counter() - started)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """
+    pymongo command listener feeding `mongodb_command_duration_seconds`.
+
+    Passed to the client through `event_listeners`. The driver calls it from
+    its own threads, and it only touches a dict keyed by request, so it does not
+    need a lock.
+    """
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        collection = target if isinstance(target, str) else ""
+        self._collections[(event.connection_id, event.request_id)] = collection
+
+    def succeeded(self, event):
+        self._observe(event, "succeeded")
+
+    def failed(self, event):
+        self._observe(event, "failed")
+
+    def _observe(self, event, outcome):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_COMMAND_LATENCY.labels(event.command_name, collection, outcome).observe(
+            event.duration_micros / 1_000_000
+        )
+
+
+class _PrincipalCacheCollector:
+    """
+    Export the principal cache counters at scrape time.
+    """
+
+    def collect(self):
+        stats = principal_cache.stats()
+        yield GaugeMetricFamily("principal_cache_entries", "Principals held in the cache.", value=stats["size"])
+        for name in ("hits", "misses", "evictions"):
+            yield CounterMetricFamily(
+                f"principal_cache_{name}", f"Principal cache {name}.", value=stats[name]
+            )
+
+
+REGISTRY.register(_PrincipalCacheCollector())
+
+
+async def monitor_event_loop(interval: float = EVENT_LOOP_LAG_INTERVAL):
+    """
+    Measure event loop lag until cancelled.
+
+    Sleeps for `interval` and records how much later than that the loop woke
+    the task up. Started as a background task from the app lifespan.
+    """
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, time.perf_counter() - started - interval))
@@ -1,36 +1,48 @@
+import logging
 import os
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from pymongo import ReturnDocument
 from fastapi import HTTPException, status
 from database.database_connection import user_collection as users_collection
 from Utils.Config import PRIVATE_KEY,PUBLIC_KEY,TOKEN_EXPIRE_TIME
+from Utils.PrincipalCache import principal_cache
+from Utils import PasswordHasher
+
+logger = logging.getLogger("attendance.auth")
 
 ALGORITHM = "RS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = TOKEN_EXPIRE_TIME
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = PasswordHasher.pwd_context
+
+# Fields a request needs from the signed-in user. The password hash and the
+# manager secret are never loaded into (or cached with) the principal.
+PRINCIPAL_PROJECTION = {
+    "username": 1, "full_name": 1, "email": 1, "role": 1,
+    "manager_id": 1, "created_at": 1, "updated_at": 1,
+}
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
-def verify_password(plain_password, hashed_password):
+async def verify_password(plain_password, hashed_password):
     """
     Verify if the plain password matches the hashed password.
 
     This function uses the password context to check if the plain password,
-    when hashed, matches the provided hashed password.
+    when hashed, matches the provided hashed password. The bcrypt work runs on
+    the password worker pool so it does not block the event loop.
     """
     
-    return pwd_context.verify(plain_password, hashed_password)
+    return await PasswordHasher.verify_password(plain_password, hashed_password)
 
-def get_password_hash(password):
+async def get_password_hash(password):
     """
-    Hash the given plain text password.
+    Hash the given plain text password on the password worker pool.
 
     """
-    return pwd_context.hash(password)
+    return await PasswordHasher.hash_password(password)
 
 def check_password_match(password: str, confirmPassword: str):
     """
@@ -61,24 +73,30 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     Retrieve the current user based on the provided JWT token.
 
     This function decodes the JWT token to extract the user's email and fetches
-    the user document from the database. If the token is invalid or the user is not found,
-    a 401 Unauthorized error is raised.
+    the user's profile fields (never the password hash) from the database. If the
+    token is invalid or the user is not found,
+    a 401 Unauthorized error is raised. Verified tokens are served from the principal
+    cache for up to PRINCIPAL_CACHE_TTL seconds, so user changes may lag by that much.
     """
+    cached = principal_cache.get(token)
+    if cached is not None:
+        return cached[1]
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
     )
     try:
         payload = jwt.decode(token, PUBLIC_KEY, algorithms=[ALGORITHM])
-        print(payload)
         email: str = payload.get("email")
         if email is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = users_collection.find_one({"email": email})
+    user = await users_collection.find_one({"email": email}, PRINCIPAL_PROJECTION)
     if user is None:
         raise credentials_exception
+    principal_cache.put(token, payload, user)
     return user
 
 async def get_current_active_manager(current_user: dict = Depends(get_current_user)):
@@ -101,11 +119,12 @@ async def authenticate_user_(email: str, password: str):
         Authenticate a user based on email and password.
 
         This function checks if a user exists with the given email and if the provided
-        password matches the stored password. It returns the user document if authentication
-        is successful; otherwise, it returns None.
+        password matches the stored password. It returns the user's ID, email and role
+        if authentication is successful; otherwise, it returns None.
     """
-    user = users_collection.find_one({"email": email})
-    print(user)
-    if not user or not verify_password(password, user["password"]):
+    user = await users_collection.find_one({"email": email}, {"email": 1, "role": 1, "password": 1})
+    if not user or not await verify_password(password, user["password"]):
+        logger.debug("Authentication failed", extra={"known_email": user is not None})
         return None
+    logger.debug("Authenticated user", extra={"user_id": str(user["_id"])})
     return user
\ No newline at end of file
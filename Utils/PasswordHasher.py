@@ -0,0 +1,115 @@
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from passlib.context import CryptContext
+from Utils.Config import (
+    BCRYPT_ROUNDS,
+    PASSWORD_HASH_EXECUTOR,
+    PASSWORD_HASH_WORKERS,
+    PASSWORD_HASH_QUEUE_SIZE,
+    PASSWORD_HASH_QUEUE_TIMEOUT,
+    PASSWORD_HASH_RETRY_AFTER,
+    BULK_HASH_WORKERS,
+)
+from Utils.Admission import Gate
+from Utils.Metrics import PASSWORD_HASH_LATENCY
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# Worker pools are created on first use in each worker process and released by
+# `shutdown()` from the app lifespan.
+_executor = None
+
+# Bulk onboarding hashes thousands of passwords at once. It gets its own process
+# pool, started on first use, so it spreads over every core without queueing in
+# front of interactive logins.
+_bulk_executor = None
+
+# One job per worker at a time; the rest wait in the gate's bounded queue
+# rather than piling up behind the pool.
+_gate = Gate(
+    "bcrypt", PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE_SIZE,
+    PASSWORD_HASH_QUEUE_TIMEOUT, PASSWORD_HASH_RETRY_AFTER,
+)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        if PASSWORD_HASH_EXECUTOR == "process":
+            _executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+    return _executor
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _hash_many(passwords: list) -> list:
+    return [pwd_context.hash(password) for password in passwords]
+
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+async def _submit(operation: str, fn, *args):
+    """
+    Run a bcrypt job on the worker pool with bounded admission.
+
+    When every worker is busy and the wait queue is full, or a job has waited
+    longer than `PASSWORD_HASH_QUEUE_TIMEOUT`, the request is rejected with a
+    429 and a jittered Retry-After header.
+    """
+    started = time.perf_counter()
+    try:
+        async with _gate.slot():
+            return await asyncio.get_running_loop().run_in_executor(_get_executor(), fn, *args)
+    finally:
+        PASSWORD_HASH_LATENCY.labels(operation).observe(time.perf_counter() - started)
+
+
+async def hash_password(password: str) -> str:
+    """
+    Hash a plain text password on the worker pool.
+    """
+    return await _submit("hash", _hash, password)
+
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """
+    Check a plain text password against a bcrypt hash on the worker pool.
+    """
+    return await _submit("verify", _verify, plain_password, hashed_password)
+
+
+async def hash_passwords(passwords: list) -> list:
+    """
+    Hash many plain text passwords in parallel on the bulk process pool.
+
+    Returns the hashes in the same order as the input.
+    """
+    global _bulk_executor
+    if not passwords:
+        return []
+    if _bulk_executor is None:
+        _bulk_executor = ProcessPoolExecutor(max_workers=BULK_HASH_WORKERS)
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    chunksize = max(1, len(passwords) // (BULK_HASH_WORKERS * 4))
+    chunks = await asyncio.gather(*(
+        loop.run_in_executor(_bulk_executor, _hash_many, passwords[i:i + chunksize])
+        for i in range(0, len(passwords), chunksize)
+    ))
+    PASSWORD_HASH_LATENCY.labels("hash_many").observe(time.perf_counter() - started)
+    return [hashed for chunk in chunks for hashed in chunk]
+
+
+def shutdown():
+    global _executor, _bulk_executor
+    for executor in (_executor, _bulk_executor):
+        if executor is not None:
+            executor.shutdown(wait=True)
+    _executor = _bulk_executor = None
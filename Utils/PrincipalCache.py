@@ -0,0 +1,82 @@
+import time
+from collections import OrderedDict
+from threading import Lock
+from Utils.Config import PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL
+
+
+class PrincipalCache:
+    """
+    Bounded in-process cache of verified token claims and user documents.
+
+    Entries are keyed by the raw bearer token and expire after the configured
+    TTL or at the token's own `exp`, whichever comes first. When the cache is
+    full the least recently used entry is evicted.
+
+    Nothing invalidates entries early, so a change to a user's role, status
+    or manager made directly in the database takes up to PRINCIPAL_CACHE_TTL
+    seconds to reach requests that present an already cached token.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, token: str):
+        """
+        Return the cached `(claims, user)` pair for a token, or None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, claims, user = entry
+            if expires_at <= time.monotonic():
+                del self._entries[token]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return claims, user
+
+    def put(self, token: str, claims: dict, user: dict):
+        """
+        Cache the verified claims and user document for a token.
+
+        The entry lives for at most `ttl_seconds` and never past the token's `exp`.
+        """
+        if self.max_entries <= 0:
+            return
+        ttl = self.ttl_seconds
+        exp = claims.get("exp")
+        if exp is not None:
+            ttl = min(ttl, exp - time.time())
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[token] = (time.monotonic() + ttl, claims, user)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+principal_cache = PrincipalCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
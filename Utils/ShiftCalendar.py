@@ -0,0 +1,222 @@
+import bisect
+import math
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import NamedTuple, Optional
+from Utils.Config import SHIFT_CACHE_SIZE, SHIFT_CACHE_TTL
+from database.database_connection import shift_collection
+
+# The standard window of each shift name; shifts whose end is before their
+# start run overnight and end on the following day.
+SHIFT_WINDOWS = {
+    "morning": ("08:00", "16:00"),
+    "afternoon": ("12:00", "21:00"),
+    "evening": ("16:00", "03:00"),
+    "night": ("21:00", "06:00"),
+}
+
+# How long before a shift starts and after it ends a punch is still accepted.
+PUNCH_TOLERANCE = timedelta(hours=1)
+
+# Fields of a shift document that define the schedule.
+SCHEDULE_FIELDS = ("shift_name", "start_time", "end_time", "weekdays", "rotation", "rotation_start")
+
+_DAY = 24 * 60
+# Anchor for schedules without a rotation start; a Monday, so day offsets of
+# the cycle line up with weekdays.
+_EPOCH = date(2001, 1, 1)
+
+
+class ShiftWindow(NamedTuple):
+    shift_name: str
+    work_date: date
+    start: datetime
+    end: datetime
+
+
+def _minutes(hh_mm: str) -> int:
+    hours, minutes = hh_mm.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def shift_minutes(start_time: str, end_time: str):
+    """
+    Return a shift's start as minutes after midnight and its length in minutes.
+    """
+    start = _minutes(start_time)
+    return start, (_minutes(end_time) - start) % _DAY or _DAY
+
+
+def _day_shift(shift_name: str, start_time: str, end_time: str):
+    return (shift_name, *shift_minutes(start_time, end_time))
+
+
+class CompiledSchedule:
+    """
+    A user's shift schedule compiled into sorted punch windows.
+
+    A schedule repeats every `len(days)` days from `anchor`; `days[i]` is the
+    `(shift_name, start_minute, length_minutes)` worked on day `i` of the
+    cycle, or None for a day off. The punch windows (each shift widened by
+    `PUNCH_TOLERANCE`) of one cycle are precomputed as minute offsets from the
+    cycle start, including the windows of the neighbouring cycles that spill
+    into it, so finding the window containing a timestamp is one modulo and
+    one binary search.
+    """
+
+    def __init__(self, anchor: date, days: list):
+        self.anchor = datetime.combine(anchor, datetime.min.time())
+        self.cycle_days = len(days)
+        self.period = self.cycle_days * _DAY
+        tolerance = PUNCH_TOLERANCE // timedelta(minutes=1)
+
+        intervals = []
+        for cycle in (-1, 0, 1):
+            for day, shift in enumerate(days):
+                if shift is None:
+                    continue
+                shift_name, start, length = shift
+                day_offset = cycle * self.cycle_days + day
+                opens = day_offset * _DAY + start - tolerance
+                closes = day_offset * _DAY + start + length + tolerance
+                if closes >= 0 and opens < self.period:
+                    intervals.append((opens, closes, day_offset, start, length, shift_name))
+        intervals.sort()
+        self._opens = [interval[0] for interval in intervals]
+        self._intervals = intervals
+
+    def window_at(self, moment: datetime) -> Optional[ShiftWindow]:
+        """
+        Return the shift window containing `moment`, or None outside every window.
+
+        The window's `work_date` is the day the shift starts, so a punch after
+        midnight for an overnight shift belongs to the previous day.
+        """
+        cycle, offset = divmod((moment - self.anchor) / timedelta(minutes=1), self.period)
+        index = bisect.bisect_right(self._opens, offset) - 1
+        # Neighbouring windows overlap by at most their tolerances, so only the
+        # latest window opened and the one before it can contain the moment.
+        for candidate in (index, index - 1):
+            if candidate < 0:
+                break
+            _, closes, day_offset, start, length, shift_name = self._intervals[candidate]
+            if offset <= closes:
+                work_date = (self.anchor + timedelta(days=int(cycle) * self.cycle_days + day_offset)).date()
+                shift_start = datetime.combine(work_date, datetime.min.time()) + timedelta(minutes=start)
+                return ShiftWindow(shift_name, work_date, shift_start, shift_start + timedelta(minutes=length))
+        return None
+
+
+def compile_schedule(shift: dict) -> CompiledSchedule:
+    """
+    Compile a shift document into a `CompiledSchedule`.
+
+    A plain shift is worked every day. `rotation` lists the shift worked on
+    each day of a repeating cycle starting on `rotation_start` (None for a day
+    off); rotation days use the standard window of their shift name, except
+    the user's own shift, which uses its stored times. `weekdays` (0 is Monday)
+    restricts either kind to those days of the week.
+    """
+    base = _day_shift(shift["shift_name"], shift["start_time"], shift["end_time"])
+    rotation = shift.get("rotation")
+    if rotation:
+        anchor = date.fromisoformat(shift["rotation_start"])
+        days = [
+            None if name is None
+            else base if name == shift["shift_name"]
+            else _day_shift(name, *SHIFT_WINDOWS[name])
+            for name in rotation
+        ]
+    else:
+        anchor, days = _EPOCH, [base]
+
+    weekdays = shift.get("weekdays")
+    if weekdays is not None:
+        cycle_days = len(days) * 7 // math.gcd(len(days), 7)
+        days = [
+            days[day % len(days)] if (anchor.weekday() + day) % 7 in weekdays else None
+            for day in range(cycle_days)
+        ]
+    return CompiledSchedule(anchor, days)
+
+
+class ShiftCalendar:
+    """
+    Bounded in-process cache of compiled shift schedules, keyed by user ID.
+
+    Users without a shift are cached too. Entries expire after `ttl_seconds`;
+    `shift_register` calls `invalidate` so a changed shift is recompiled on
+    the next punch in this worker, and the TTL bounds how long other workers
+    keep the old one. The cache is only touched from the event loop.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+
+    def _get(self, user_id: str):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return False, None
+        expires_at, schedule = entry
+        if expires_at <= time.monotonic():
+            del self._entries[user_id]
+            return False, None
+        self._entries.move_to_end(user_id)
+        return True, schedule
+
+    def _put(self, user_id: str, shift: Optional[dict]) -> Optional[CompiledSchedule]:
+        schedule = compile_schedule(shift) if shift else None
+        if self.max_entries > 0:
+            self._entries[user_id] = (time.monotonic() + self.ttl_seconds, schedule)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return schedule
+
+    async def schedule_for(self, user_id: str) -> Optional[CompiledSchedule]:
+        """
+        Return a user's compiled schedule, or None when no shift is assigned.
+        """
+        found, schedule = self._get(user_id)
+        if found:
+            return schedule
+        shift = await shift_collection.find_one({"user_id": user_id}, {field: 1 for field in SCHEDULE_FIELDS})
+        return self._put(user_id, shift)
+
+    async def schedules_for(self, user_ids) -> dict:
+        """
+        Return the compiled schedules of several users, loading misses in one query.
+
+        Users without a shift are left out of the result.
+        """
+        schedules, missing = {}, set()
+        for user_id in user_ids:
+            found, schedule = self._get(user_id)
+            if not found:
+                missing.add(user_id)
+            elif schedule is not None:
+                schedules[user_id] = schedule
+        if missing:
+            shifts = {
+                shift["user_id"]: shift
+                async for shift in shift_collection.find(
+                    {"user_id": {"$in": list(missing)}}, {"user_id": 1, **{field: 1 for field in SCHEDULE_FIELDS}}
+                )
+            }
+            for user_id in missing:
+                schedule = self._put(user_id, shifts.get(user_id))
+                if schedule is not None:
+                    schedules[user_id] = schedule
+        return schedules
+
+    def invalidate(self, user_id: str):
+        self._entries.pop(str(user_id), None)
+
+    def clear(self):
+        self._entries.clear()
+
+
+shift_calendar = ShiftCalendar(SHIFT_CACHE_SIZE, SHIFT_CACHE_TTL)
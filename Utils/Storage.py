@@ -0,0 +1,235 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+import boto3
+from botocore.config import Config as BotoConfig
+from Utils.Config import (
+    bucket_name,
+    AWS_REGION,
+    AWS_ACCESS_KEY_ID,
+    AWS_SECRET_ACCESS_KEY,
+    S3_ENDPOINT_URL,
+    S3_UPLOAD_CONCURRENCY,
+    S3_UPLOAD_QUEUE_SIZE,
+    S3_UPLOAD_QUEUE_TIMEOUT,
+    S3_UPLOAD_PART_SIZE,
+    S3_UPLOAD_READ_SIZE,
+)
+from Utils.Admission import Gate
+from Utils.Metrics import S3_UPLOAD_LATENCY, S3_UPLOAD_BYTES
+
+# boto3 is blocking, so every S3 call runs on a dedicated thread pool. The
+# upload gate caps how many uploads are in progress at once so a burst of photos
+# cannot take every thread (and every connection in the boto3 pool) away from
+# the other routes; uploads beyond its queue or deadline get a 429. The client
+# and pool are created on first use in each worker process and released by
+# `shutdown()`.
+_client = None
+_executor = None
+_upload_slots = Gate("s3-upload", S3_UPLOAD_CONCURRENCY, S3_UPLOAD_QUEUE_SIZE, S3_UPLOAD_QUEUE_TIMEOUT)
+
+
+def get_s3_client():
+    global _client
+    if _client is None:
+        credentials = {}
+        if AWS_ACCESS_KEY_ID:
+            credentials = {"aws_access_key_id": AWS_ACCESS_KEY_ID, "aws_secret_access_key": AWS_SECRET_ACCESS_KEY}
+        _client = boto3.client(
+            's3',
+            region_name=AWS_REGION,
+            endpoint_url=S3_ENDPOINT_URL,
+            config=BotoConfig(max_pool_connections=S3_UPLOAD_CONCURRENCY),
+            **credentials,
+        )
+    return _client
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=S3_UPLOAD_CONCURRENCY, thread_name_prefix="s3")
+    return _executor
+
+
+async def _call(operation: str, **kwargs):
+    method = getattr(get_s3_client(), operation)
+    return await asyncio.get_running_loop().run_in_executor(_get_executor(), lambda: method(**kwargs))
+
+
+def shutdown():
+    """
+    Wait for in-flight S3 calls to finish, then close the client's connection pool.
+    """
+    global _client, _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
+async def iter_upload_file(upload, chunk_size: int = S3_UPLOAD_READ_SIZE):
+    """
+    Yield the contents of a FastAPI `UploadFile` in fixed-size chunks.
+    """
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def object_url(key: str) -> str:
+    """
+    Build the URL an uploaded object is served from.
+    """
+    if S3_ENDPOINT_URL:
+        return f"{S3_ENDPOINT_URL.rstrip('/')}/{bucket_name}/{key}"
+    region = AWS_REGION or get_s3_client().meta.region_name
+    return f"https://{bucket_name}.s3.{region}.amazonaws.com/{key}"
+
+
+async def upload_stream(chunks, key: str, content_type: str = None, extra_args: dict = None):
+    """
+    Stream an async iterator of byte chunks to S3.
+
+    Chunks are buffered up to `S3_UPLOAD_PART_SIZE`. A body that ends before the
+    first part fills is sent with a single `put_object`; anything larger becomes a
+    multipart upload, sent one part at a time, so memory per upload stays at about
+    one part. A failed multipart upload is aborted so no orphaned parts are left.
+    Returns the object key, its size in bytes and the upload time in seconds.
+    """
+    object_args = dict(extra_args or {})
+    if content_type:
+        object_args["ContentType"] = content_type
+
+    async with _upload_slots.slot():
+        started = time.perf_counter()
+        buffer = bytearray()
+        size = 0
+        upload_id = None
+        parts = []
+        try:
+            async for chunk in chunks:
+                buffer += chunk
+                size += len(chunk)
+                while len(buffer) >= S3_UPLOAD_PART_SIZE:
+                    if upload_id is None:
+                        response = await _call(
+                            "create_multipart_upload",
+                            Bucket=bucket_name, Key=key, **object_args,
+                        )
+                        upload_id = response["UploadId"]
+                    part = bytes(buffer[:S3_UPLOAD_PART_SIZE])
+                    del buffer[:S3_UPLOAD_PART_SIZE]
+                    parts.append(await _upload_part(key, upload_id, len(parts) + 1, part))
+
+            if upload_id is None:
+                await _call(
+                    "put_object",
+                    Bucket=bucket_name, Key=key, Body=bytes(buffer), **object_args,
+                )
+            else:
+                if buffer:
+                    parts.append(await _upload_part(key, upload_id, len(parts) + 1, bytes(buffer)))
+                await _call(
+                    "complete_multipart_upload",
+                    Bucket=bucket_name, Key=key, UploadId=upload_id,
+                    MultipartUpload={"Parts": parts},
+                )
+        except BaseException:
+            if upload_id is not None:
+                await _call(
+                    "abort_multipart_upload",
+                    Bucket=bucket_name, Key=key, UploadId=upload_id,
+                )
+            raise
+
+    seconds = time.perf_counter() - started
+    method = "put_object" if upload_id is None else "multipart"
+    S3_UPLOAD_LATENCY.labels(method).observe(seconds)
+    S3_UPLOAD_BYTES.labels(method).inc(size)
+    return {"key": key, "size": size, "seconds": seconds}
+
+
+async def upload_bytes(body: bytes, key: str, content_type: str = None, extra_args: dict = None):
+    """
+    Upload an in-memory body through `upload_stream`.
+    """
+    async def chunks():
+        yield body
+
+    return await upload_stream(chunks(), key, content_type=content_type, extra_args=extra_args)
+
+
+def _is_missing(error: ClientError) -> bool:
+    return error.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+
+async def head_object(key: str):
+    """
+    Fetch an object's metadata with a HEAD request, or None if it does not exist.
+    """
+    try:
+        return await _call("head_object", Bucket=bucket_name, Key=key)
+    except ClientError as e:
+        if _is_missing(e):
+            return None
+        raise
+
+
+async def object_exists(key: str) -> bool:
+    return await head_object(key) is not None
+
+
+async def download_bytes(key: str):
+    """
+    Read a whole object into memory, or return None if it does not exist.
+    """
+    def get():
+        try:
+            response = get_s3_client().get_object(Bucket=bucket_name, Key=key)
+        except ClientError as e:
+            if _is_missing(e):
+                return None
+            raise
+        body = response["Body"]
+        try:
+            return body.read()
+        finally:
+            body.close()
+
+    return await asyncio.get_running_loop().run_in_executor(_get_executor(), get)
+
+
+async def delete_object(key: str):
+    """
+    Delete an object; deleting a missing key is not an error.
+    """
+    await _call("delete_object", Bucket=bucket_name, Key=key)
+
+
+def presigned_put_url(key: str, content_type: str, expires_in: int, acl: str = None) -> str:
+    """
+    Presign a PUT so a client can upload one object directly to the bucket.
+
+    The signature covers the content type (and ACL, if given), so the client
+    must send matching `Content-Type` and `x-amz-acl` headers. Signing is
+    local; no request is made to S3.
+    """
+    params = {"Bucket": bucket_name, "Key": key, "ContentType": content_type}
+    if acl:
+        params["ACL"] = acl
+    return get_s3_client().generate_presigned_url("put_object", Params=params, ExpiresIn=expires_in)
+
+
+async def _upload_part(key: str, upload_id: str, part_number: int, body: bytes) -> dict:
+    response = await _call(
+        "upload_part",
+        Bucket=bucket_name, Key=key, UploadId=upload_id, PartNumber=part_number, Body=body,
+    )
+    return {"ETag": response["ETag"], "PartNumber": part_number}
+
@@ -1,11 +1,68 @@
+import time
+
+_import_started = time.perf_counter()
+
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from routes.authentication_routes import routes as auth
 from routes.shift_routes import routes as shift
-from routes.attendance_routes import router as attendance
+from routes.attendance_routes import router as attendance, attendance_gate
+from routes.report_routes import routes as reports
+from routes.metrics_routes import routes as metrics
+from database import database_connection, outbox
+from Utils import PasswordHasher, ImagePipeline, Storage
+from Utils.LogConfig import setup_logging, stop_logging
+from Utils.Admission import AdmissionMiddleware
+from Utils.Metrics import MetricsMiddleware, monitor_event_loop
+
+logger = logging.getLogger("attendance")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Create this worker's clients on startup and drain them on shutdown.
+
+    Each worker process builds its own MongoDB and S3 clients here, after any
+    fork, and starts its background task workers. On shutdown the background
+    workers and then the worker pools are drained first, so in-flight uploads
+    and hashes finish, and then the S3 and MongoDB connection pools are closed.
+    """
+    setup_logging()
+    database_connection.connect()
+    Storage.get_s3_client()
+    await database_connection.ensure_indexes()
+    outbox.start()
+    app.state.cold_start_seconds = time.perf_counter() - _import_started
+    logger.info(
+        "Worker ready",
+        extra={"pid": os.getpid(), "cold_start_seconds": round(app.state.cold_start_seconds, 3)},
+    )
+    loop_monitor = asyncio.create_task(monitor_event_loop())
+    yield
+    loop_monitor.cancel()
+    await outbox.stop()
+    ImagePipeline.shutdown()
+    PasswordHasher.shutdown()
+    Storage.shutdown()
+    database_connection.close()
+    stop_logging()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+app.add_middleware(AdmissionMiddleware, routes={
+    ("POST", "/api/v1/attendance/"): attendance_gate,
+    ("POST", "/api/v1/attendance/confirm"): attendance_gate,
+})
+app.add_middleware(MetricsMiddleware)
 
 
 app.include_router(auth, prefix="/api/v1/auth")
 app.include_router(shift, prefix="/api/v1/shift")
 app.include_router(attendance, prefix="/api/v1/attendance")
+app.include_router(reports, prefix="/api/v1/reports")
+app.include_router(metrics)
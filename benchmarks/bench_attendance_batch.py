@@ -0,0 +1,119 @@
+"""
+Batch attendance ingestion vs. N sequential single-punch calls.
+
+Seeds one manager and N staff whose shifts are open right now. Then it
+replays one punch per staff member in two ways: as N sequential
+`POST /api/v1/attendance/` calls, and as a single `POST /api/v1/attendance/batch`.
+The app runs in-process against the database configured in Utils/.env. Pass
+--mock-s3 to use moto instead of the configured bucket.
+
+    python benchmarks/bench_attendance_batch.py --punches 200 --mock-s3
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+async def main(args):
+    import httpx
+    from app import app
+    from Utils.OAuth import create_access_token
+    from database.database_connection import (
+        user_collection, shift_collection, attendance_bucket_collection, ensure_indexes,
+    )
+
+    await ensure_indexes()
+    run = f"bench-batch-{int(time.time())}"
+    now = datetime.now()
+    manager = {"email": f"{run}-manager@example.com", "role": "manager", "manager_id": ""}
+    await user_collection.insert_one(manager)
+    manager_id = str(manager["_id"])
+    staff = [
+        {"email": f"{run}-staff{i}@example.com", "role": "staff", "manager_id": manager_id}
+        for i in range(args.punches)
+    ]
+    await user_collection.insert_many(staff)
+    staff_ids = [str(user["_id"]) for user in staff]
+    await shift_collection.insert_many([
+        {
+            "user_id": user_id,
+            "shift_name": "morning",
+            "start_time": (now - timedelta(minutes=30)).strftime("%H:%M"),
+            "end_time": (now + timedelta(hours=6)).strftime("%H:%M"),
+        }
+        for user_id in staff_ids
+    ])
+    image = os.urandom(args.image_bytes)
+    results = []
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+        for user in staff:
+            token = create_access_token({"email": user["email"], "role": "staff", "_id": str(user["_id"])})
+            response = await client.post(
+                "/api/v1/attendance/",
+                files={"image": ("punch.jpg", image, "image/jpeg")},
+                headers={"Authorization": f"Bearer {token}"},
+            )
+            response.raise_for_status()
+        elapsed = time.perf_counter() - started
+        results.append({
+            "variant": "sequential-single",
+            "punches": args.punches,
+            "seconds": round(elapsed, 3),
+            "punches_per_second": round(args.punches / elapsed, 1),
+        })
+
+        await attendance_bucket_collection.delete_many({"user_id": {"$in": staff_ids}})
+        token = create_access_token({"email": manager["email"], "role": "manager", "_id": manager_id})
+        punches = "\n".join(
+            json.dumps({"user_id": user_id, "timestamp": now.isoformat(), "image": f"image{i}"})
+            for i, user_id in enumerate(staff_ids)
+        )
+        files = [(f"image{i}", ("punch.jpg", image, "image/jpeg")) for i in range(args.punches)]
+        started = time.perf_counter()
+        response = await client.post(
+            "/api/v1/attendance/batch",
+            data={"punches": punches},
+            files=files,
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        response.raise_for_status()
+        elapsed = time.perf_counter() - started
+        results.append({
+            "variant": "batch",
+            "punches": args.punches,
+            "accepted": response.json()["accepted"],
+            "seconds": round(elapsed, 3),
+            "punches_per_second": round(args.punches / elapsed, 1),
+        })
+
+    await attendance_bucket_collection.delete_many({"user_id": {"$in": staff_ids}})
+    await shift_collection.delete_many({"user_id": {"$in": staff_ids}})
+    await user_collection.delete_many({"email": {"$regex": f"^{run}-"}})
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--punches", type=int, default=200)
+    parser.add_argument("--image-bytes", type=int, default=200 * 1024)
+    parser.add_argument("--mock-s3", action="store_true")
+    args = parser.parse_args()
+    if args.mock_s3:
+        from moto import mock_aws
+        import boto3
+
+        with mock_aws():
+            from Utils.Config import bucket_name, AWS_REGION
+            boto3.client("s3", region_name=AWS_REGION).create_bucket(Bucket=bucket_name)
+            asyncio.run(main(args))
+    else:
+        asyncio.run(main(args))
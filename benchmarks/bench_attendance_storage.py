@@ -0,0 +1,154 @@
+"""
+Storage size and range-query latency: one document per punch vs. monthly buckets.
+
+Seeds the same history into both layouts in a scratch database (the old
+per-punch documents with date/time strings and full image URLs, and the
+bucket documents written by the API now), then reports each collection's
+data, storage and index size from `$collStats` and times two reads:
+
+    user-month    one user's punches for a month (the attendance history view)
+    range-report  every punch in a date range (the report and rollup rebuild)
+
+    DATABASE_URL=mongodb://localhost:27017 python benchmarks/bench_attendance_storage.py --users 2000 --days 365
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import ASCENDING, MongoClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from database.attendance_buckets import day_key, flatten_punches, month_match, month_start, punch_entry  # noqa: E402
+
+DB_NAME = "attendance_storage_bench"
+IMAGE_PREFIX = "https://attendance-bench.s3.us-east-1.amazonaws.com/attendance_images/"
+
+
+def _seed(db, users, days, batch_size, rng):
+    old, new = db["attendance"], db["attendance_buckets"]
+    old.create_index([("user_id", ASCENDING), ("date", ASCENDING)], unique=True)
+    new.create_index([("user_id", ASCENDING), ("month", ASCENDING)], unique=True)
+
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    user_ids = [str(ObjectId()) for _ in range(users)]
+    for user_id in user_ids:
+        records, buckets = [], {}
+        for days_ago in range(days, 0, -1):
+            day = today - timedelta(days=days_ago)
+            if day.weekday() >= 5:
+                continue
+            punched = day + timedelta(hours=8, minutes=rng.randint(-10, 15), seconds=rng.randint(0, 59))
+            image = f"{rng.getrandbits(256):064x}.webp"
+            late = punched > day + timedelta(hours=8)
+            punch_id = ObjectId()
+            records.append({
+                "_id": punch_id, "user_id": user_id, "date": punched.strftime("%Y-%m-%d"),
+                "time_in": punched.strftime("%H:%M:%S"), "image": IMAGE_PREFIX + image, "status": "Present",
+                "shift_name": "morning", "late": late, "created_at": punched, "updated_at": punched,
+            })
+            bucket = buckets.setdefault(month_start(punched), {
+                "user_id": user_id, "month": month_start(punched), "count": 0, "punches": {},
+            })
+            bucket["punches"][day_key(punched)] = punch_entry(
+                punched, "attendance_images/" + image, "morning", late, punch_id=punch_id,
+            )
+            bucket["count"] += 1
+        for start in range(0, len(records), batch_size):
+            old.insert_many(records[start:start + batch_size], ordered=False)
+        new.insert_many(list(buckets.values()), ordered=False)
+    return user_ids, today
+
+
+def _stats(collection):
+    stats = next(collection.aggregate([{"$collStats": {"storageStats": {}}}]))["storageStats"]
+    return {
+        "documents": stats["count"],
+        "data_bytes": stats["size"],
+        "storage_bytes": stats["storageSize"],
+        "index_bytes": stats["totalIndexSize"],
+    }
+
+
+def _time(query, iterations):
+    latencies = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        query(i)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return {
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--range-days", type=int, default=7, help="Length of the range-report window.")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    client = MongoClient(os.getenv("DATABASE_URL", "mongodb://localhost:27017"))
+    client.drop_database(DB_NAME)
+    db = client[DB_NAME]
+    rng = random.Random(args.seed)
+    user_ids, today = _seed(db, args.users, args.days, args.batch_size, rng)
+
+    month = month_start(today - timedelta(days=40))
+    month_end = (month + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    range_start = (today - timedelta(days=args.range_days + 1)).date()
+    range_end = (today - timedelta(days=1)).date()
+
+    def old_user_month(i):
+        list(db["attendance"].find({
+            "user_id": user_ids[i % len(user_ids)],
+            "date": {"$gte": month.strftime("%Y-%m-%d"), "$lte": month_end.strftime("%Y-%m-%d")},
+        }))
+
+    def new_user_month(i):
+        list(db["attendance_buckets"].aggregate([
+            {"$match": {"user_id": user_ids[i % len(user_ids)], **month_match(month, month_end)}},
+            *flatten_punches(month.date(), month_end.date()),
+        ]))
+
+    def old_range(i):
+        list(db["attendance"].find({
+            "date": {"$gte": range_start.strftime("%Y-%m-%d"), "$lte": range_end.strftime("%Y-%m-%d")},
+        }))
+
+    def new_range(i):
+        list(db["attendance_buckets"].aggregate([
+            {"$match": month_match(range_start, range_end)}, *flatten_punches(range_start, range_end),
+        ]))
+
+    range_iterations = max(1, args.iterations // 20)
+    results = {
+        "users": args.users,
+        "days": args.days,
+        "storage": {"per_punch": _stats(db["attendance"]), "buckets": _stats(db["attendance_buckets"])},
+        "user-month": {
+            "per_punch": _time(old_user_month, args.iterations),
+            "buckets": _time(new_user_month, args.iterations),
+        },
+        "range-report": {
+            "per_punch": _time(old_range, range_iterations),
+            "buckets": _time(new_range, range_iterations),
+        },
+    }
+    client.drop_database(DB_NAME)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Bulk staff onboarding throughput in rows per second.
+
+Registers N staff under a fresh manager two ways: N sequential
+`POST /api/v1/auth/register-staff` calls, and one
+`POST /api/v1/auth/register-staff/bulk` call. The app runs in-process against
+the database configured in Utils/.env. BCRYPT_ROUNDS controls the hash cost.
+
+    BCRYPT_ROUNDS=12 python benchmarks/bench_bulk_register.py --rows 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+async def main(args):
+    import httpx
+    from app import app
+    from Utils.OAuth import create_access_token
+    from database.database_connection import user_collection, ensure_indexes
+
+    await ensure_indexes()
+    run = f"bench-bulk-{int(time.time())}"
+    manager = {"email": f"{run}-manager@example.com", "role": "manager", "manager_id": ""}
+    await user_collection.insert_one(manager)
+    token = create_access_token({"email": manager["email"], "role": "manager", "_id": str(manager["_id"])})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    def rows(variant):
+        return [
+            {
+                "username": f"staff{i}",
+                "password": "correct horse battery staple",
+                "confirm_password": "correct horse battery staple",
+                "full_name": f"Staff {i}",
+                "email": f"{run}-{variant}-{i}@example.com",
+                "role": "staff",
+            }
+            for i in range(args.rows)
+        ]
+
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        started = time.perf_counter()
+        for row in rows("single"):
+            response = await client.post("/api/v1/auth/register-staff", json=row, headers=headers)
+            response.raise_for_status()
+        elapsed = time.perf_counter() - started
+        results.append({
+            "variant": "sequential-single",
+            "rows": args.rows,
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round(args.rows / elapsed, 1),
+        })
+
+        started = time.perf_counter()
+        response = await client.post("/api/v1/auth/register-staff/bulk", json=rows("bulk"), headers=headers)
+        response.raise_for_status()
+        elapsed = time.perf_counter() - started
+        results.append({
+            "variant": "bulk",
+            "rows": args.rows,
+            "created": response.json()["created"],
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round(args.rows / elapsed, 1),
+        })
+
+    await user_collection.delete_many({"email": {"$regex": f"^{run}-"}})
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=500)
+    asyncio.run(main(parser.parse_args()))
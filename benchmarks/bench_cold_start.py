@@ -0,0 +1,80 @@
+"""
+Worker cold start: time to import the app and time to first response.
+
+Each run starts a fresh interpreter. The import phase imports `app` only,
+which should not open any MongoDB or S3 connection. The first-response phase
+launches `main.py --prod` with a single worker and polls until `/docs`
+answers, which includes the lifespan (client creation and index checks).
+
+    DATABASE_URL=mongodb://localhost:27017 python benchmarks/bench_cold_start.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = (
+    "import time; started = time.perf_counter(); import app; "
+    "print(time.perf_counter() - started)"
+)
+
+
+def _import_seconds():
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        cwd=ROOT, check=True, capture_output=True, text=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def _first_response_seconds(port, timeout):
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "main.py", "--prod", "--workers", "1", "--port", str(port)],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/docs", timeout=1):
+                    return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.02)
+        raise RuntimeError(f"Server did not answer within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def _summary(samples):
+    return {
+        "runs": len(samples),
+        "min_s": round(min(samples), 4),
+        "median_s": round(statistics.median(samples), 4),
+        "max_s": round(max(samples), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8950)
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args()
+
+    imports = [_import_seconds() for _ in range(args.runs)]
+    first_responses = [_first_response_seconds(args.port, args.timeout) for _ in range(args.runs)]
+    print(json.dumps({
+        "import_app": _summary(imports),
+        "first_response": _summary(first_responses),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Cost of the attendance feed broker: idle subscribers and publish fan-out.
+
+Opens `--subscribers` subscriptions spread over `--managers` topics, each
+with a task waiting on it the way the SSE endpoint does, and reports the
+memory held per idle subscriber. Then publishes `--events` clock-in
+messages to random managers and reports the publish latency and how many
+subscribers each message reached, with every subscriber draining its
+buffer. Finally a single subscriber stops reading and the script confirms
+it is cut off after `--buffer-size` messages while the others keep up.
+
+    python benchmarks/bench_feed.py --subscribers 5000 --managers 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from Utils.Broker import Broker, DROPPED  # noqa: E402
+
+
+async def _consume(subscription, received):
+    while True:
+        message = await subscription.get(3600)
+        if message is DROPPED or message == b"":
+            return
+        received[0] += 1
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subscribers", type=int, default=5000)
+    parser.add_argument("--managers", type=int, default=500)
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--buffer-size", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    message = b'event: clock_in\ndata: {"attendance_id":"66b0a1f2c3d4e5f607182930","late":false}\n\n'
+
+    broker = Broker("bench", args.buffer_size, args.subscribers + 1)
+    received = [0]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    subscriptions = [broker.subscribe(f"manager{i % args.managers}") for i in range(args.subscribers)]
+    consumers = [asyncio.create_task(_consume(subscription, received)) for subscription in subscriptions]
+    await asyncio.sleep(0)
+    per_subscriber = (tracemalloc.get_traced_memory()[0] - before) / args.subscribers
+    tracemalloc.stop()
+
+    latencies, fan_out = [], []
+    for _ in range(args.events):
+        started = time.perf_counter()
+        fan_out.append(broker.publish(f"manager{rng.randrange(args.managers)}", message))
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(0)
+    latencies.sort()
+
+    slow = broker.subscribe("manager0")
+    for _ in range(args.buffer_size + 1):
+        broker.publish("manager0", message)
+        await asyncio.sleep(0)
+    slow_dropped = await slow.get(0) is DROPPED
+
+    broker.unsubscribe(slow)
+    for manager in range(args.managers):
+        broker.publish(f"manager{manager}", b"")
+    await asyncio.gather(*consumers)
+    print(json.dumps({
+        "subscribers": args.subscribers,
+        "idle_bytes_per_subscriber": round(per_subscriber),
+        "publish_p50_us": round(statistics.median(latencies) * 1e6, 1),
+        "publish_p99_us": round(latencies[int(len(latencies) * 0.99) - 1] * 1e6, 1),
+        "mean_fan_out": round(statistics.mean(fan_out), 1),
+        "messages_received": received[0],
+        "slow_subscriber_dropped": slow_dropped,
+        "subscribers_left": broker.subscribers,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+"""
+Concurrent-request throughput: blocking pymongo vs. the async motor data layer.
+
+Each simulated request does what `get_current_user` + `mark_attendance` do on
+the database (a user lookup, a shift lookup and an insert). The blocking
+variant calls pymongo from inside a coroutine, exactly like the old routes;
+the async variant awaits motor. A ticker task records how long the event loop
+is stalled while the requests run.
+
+    DATABASE_URL=mongodb://localhost:27017 python benchmarks/bench_mongo_concurrency.py --requests 2000 --concurrency 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient
+
+DB_NAME = "attendance_bench"
+
+
+async def _ticker(stop: asyncio.Event, stalls: list):
+    interval = 0.01
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        stalls.append(time.perf_counter() - started - interval)
+
+
+async def _run(label, request, total, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    stop, stalls = asyncio.Event(), []
+    ticker = asyncio.create_task(_ticker(stop, stalls))
+
+    async def one(i):
+        async with semaphore:
+            await request(i)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker
+    return {
+        "variant": label,
+        "requests": total,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(total / elapsed, 1),
+        "max_loop_stall_ms": round(max(stalls, default=0) * 1000, 2),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    args = parser.parse_args()
+
+    url = os.getenv("DATABASE_URL", "mongodb://localhost:27017")
+    sync_db = MongoClient(url)[DB_NAME]
+    async_db = AsyncIOMotorClient(url, maxPoolSize=args.concurrency)[DB_NAME]
+
+    sync_db.users.drop()
+    sync_db.shifts.drop()
+    sync_db.attendance.drop()
+    sync_db.users.insert_many(
+        [{"email": f"staff{i}@example.com", "role": "staff"} for i in range(1000)]
+    )
+    sync_db.shifts.insert_many(
+        [{"user_id": str(i), "shift_name": "morning"} for i in range(1000)]
+    )
+
+    async def blocking_request(i):
+        sync_db.users.find_one({"email": f"staff{i % 1000}@example.com"})
+        sync_db.shifts.find_one({"user_id": str(i % 1000)})
+        sync_db.attendance.insert_one({"user_id": str(i), "status": "Present"})
+
+    async def async_request(i):
+        await async_db.users.find_one({"email": f"staff{i % 1000}@example.com"})
+        await async_db.shifts.find_one({"user_id": str(i % 1000)})
+        await async_db.attendance.insert_one({"user_id": str(i), "status": "Present"})
+
+    results = [
+        await _run("blocking-pymongo", blocking_request, args.requests, args.concurrency),
+        await _run("async-motor", async_request, args.requests, args.concurrency),
+    ]
+    print(json.dumps(results, indent=2))
+    sync_db.client.drop_database(DB_NAME)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,160 @@
+"""
+Payroll computation: NumPy columns vs. a per-record Python loop.
+
+Generates a month of punches for `--staff` staff members in the shape the
+payroll cursor yields (staff document, shift and the month's punches; most
+with a clock-out, some late, some leaving early or staying on) and computes
+the per-staff totals twice: with `database.payroll.payroll_rows`, chunk by
+chunk as the export job does, and with a straightforward loop over every
+punch document using datetime arithmetic. The vectorized side is given the
+punches already reduced to epoch milliseconds, as the job's aggregation
+does on the server. Both must agree; the script prints the timings and the
+peak memory of each.
+
+    python benchmarks/bench_payroll.py --staff 10000 --days 31
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from database.payroll import PAYROLL_FIELDS, payroll_rows  # noqa: E402
+from Utils.Config import LATE_GRACE_MINUTES  # noqa: E402
+from Utils.ShiftCalendar import SHIFT_WINDOWS  # noqa: E402
+
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _staff(count, days, rng):
+    month = datetime(2024, 8, 1)
+    managers = [str(ObjectId()) for _ in range(max(1, count // 50))]
+    staff = []
+    for i in range(count):
+        shift_name = rng.choice(list(SHIFT_WINDOWS))
+        start_time, end_time = SHIFT_WINDOWS[shift_name]
+        start = datetime.strptime(start_time, "%H:%M")
+        length = (datetime.strptime(end_time, "%H:%M") - start) % timedelta(days=1)
+        punches = {}
+        for day in range(days):
+            if rng.random() < 0.1:
+                continue
+            shift_date = month + timedelta(days=day)
+            shift_start = shift_date.replace(hour=start.hour, minute=start.minute)
+            clock_in = shift_start + timedelta(minutes=rng.randint(-15, 20), seconds=rng.randint(0, 59))
+            punch = {"id": ObjectId(), "t": clock_in, "d": shift_date, "img": "", "shift": shift_name}
+            if rng.random() < 0.9:
+                punch["o"] = shift_start + length + timedelta(minutes=rng.randint(-45, 90))
+            punches[f"{day + 1:02d}"] = punch
+        staff.append({
+            "user_id": str(ObjectId()), "manager_id": managers[i % len(managers)],
+            "username": f"staff{i}", "full_name": f"Staff {i}", "email": f"staff{i}@example.com",
+            "shift": {"shift_name": shift_name, "start_time": start_time, "end_time": end_time},
+            "punches": punches,
+        })
+    staff.sort(key=lambda member: member["manager_id"])
+    return staff
+
+
+def _naive(staff):
+    rows = []
+    for member in staff:
+        shift = member["shift"]
+        start = datetime.strptime(shift["start_time"], "%H:%M")
+        length = (datetime.strptime(shift["end_time"], "%H:%M") - start) % timedelta(days=1)
+        totals = dict.fromkeys(PAYROLL_FIELDS[6:], 0)
+        for punch in member["punches"].values():
+            shift_start = punch["d"].replace(hour=start.hour, minute=start.minute)
+            shift_end = shift_start + length
+            late = (punch["t"] - shift_start) / timedelta(minutes=1)
+            totals["days_present"] += 1
+            if late > LATE_GRACE_MINUTES:
+                totals["days_late"] += 1
+                totals["late_minutes"] += late
+            if punch.get("o") is None:
+                totals["missing_clock_outs"] += 1
+                continue
+            past_end = (punch["o"] - shift_end) / timedelta(minutes=1)
+            if past_end < 0:
+                totals["early_departures"] += 1
+                totals["early_departure_minutes"] -= past_end
+            else:
+                totals["overtime_minutes"] += past_end
+            totals["worked_minutes"] += (punch["o"] - punch["t"]) / timedelta(minutes=1)
+        rows.append([
+            member["manager_id"], member["user_id"], member["username"], member["full_name"],
+            member["email"], shift["shift_name"], *(round(totals[field]) for field in PAYROLL_FIELDS[6:]),
+        ])
+    return rows
+
+
+def _pipeline_shape(staff):
+    """
+    The staff documents as `payroll_pipeline` returns them: punches reduced to
+    [shift, date, clock-in, clock-out] with dates as epoch milliseconds.
+    """
+    def millis(moment):
+        return None if moment is None else (moment - _EPOCH) // timedelta(milliseconds=1)
+
+    return [
+        {**member, "punches": [
+            [punch["shift"], millis(punch["d"]), millis(punch["t"]), millis(punch.get("o"))]
+            for punch in member["punches"].values()
+        ]}
+        for member in staff
+    ]
+
+
+def _vectorized(staff, chunk_size):
+    rows = []
+    for start in range(0, len(staff), chunk_size):
+        rows.extend(payroll_rows(staff[start:start + chunk_size]))
+    return rows
+
+
+def _measure(function, *args):
+    # Timed and traced in separate runs; tracing slows the loop down several times.
+    started = time.perf_counter()
+    result = function(*args)
+    seconds = time.perf_counter() - started
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, {"seconds": round(seconds, 3), "peak_mib": round(peak / 2 ** 20, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--staff", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=31)
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    staff = _staff(args.staff, args.days, random.Random(args.seed))
+    naive_rows, naive = _measure(_naive, staff)
+    vector_rows, vectorized = _measure(_vectorized, _pipeline_shape(staff), args.chunk_size)
+    mismatches = sum(
+        1 for a, b in zip(naive_rows, vector_rows)
+        if a[:6] != b[:6] or any(abs(x - y) > 1 for x, y in zip(a[6:], b[6:]))
+    )
+    print(json.dumps({
+        "staff": args.staff,
+        "punches": sum(len(member["punches"]) for member in staff),
+        "naive": naive,
+        "vectorized": vectorized,
+        "mismatched_rows": mismatches,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Payload size and serialization time for the user and shift responses.
+
+"before" is what the routes used to do: return the whole Mongo document
+(for /auth/user, everything but `_id`, password hash included) through
+FastAPI's default jsonable_encoder + JSONResponse. "after" validates the
+projected document against the response model and renders it with
+ORJSONResponse, which is what FastAPI does now that the routes declare a
+`response_model` and the app's default response class is ORJSONResponse.
+
+    python benchmarks/bench_serialization.py --iterations 20000
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from models.shifts import ShiftDetails  # noqa: E402
+from models.user_model import UserProfile  # noqa: E402
+
+USER = {
+    "_id": ObjectId(),
+    "username": "jdoe",
+    "password": "$2b$12$" + "x" * 53,
+    "role": "staff",
+    "full_name": "Jane Doe",
+    "email": "jane.doe@example.com",
+    "manager_secret_key": "",
+    "manager_id": str(ObjectId()),
+    "created_at": 1724500000,
+    "updated_at": 1724500000,
+}
+SHIFT = {
+    "_id": ObjectId(),
+    "user_id": str(ObjectId()),
+    "shift_name": "morning",
+    "start_time": "08:00",
+    "end_time": "16:00",
+    "created_at": 1724500000,
+    "updated_at": 1724500000,
+}
+USER_FIELDS = ("username", "full_name", "email", "role", "manager_id", "created_at", "updated_at")
+SHIFT_FIELDS = ("user_id", "shift_name", "start_time", "end_time", "created_at", "updated_at")
+
+
+def _before(document):
+    return JSONResponse(jsonable_encoder(document)).body
+
+
+def _after(model, document):
+    return ORJSONResponse(model.model_validate(document).model_dump(mode="json")).body
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    cases = {
+        "auth-user": (
+            {key: value for key, value in USER.items() if key != "_id"},
+            UserProfile, {key: USER[key] for key in USER_FIELDS},
+        ),
+        "shift": (
+            {key: value for key, value in SHIFT.items() if key != "_id"},
+            ShiftDetails, {key: SHIFT[key] for key in SHIFT_FIELDS},
+        ),
+    }
+    results = []
+    for name, (raw, model, projected) in cases.items():
+        before = timeit.timeit(lambda: _before(raw), number=args.iterations)
+        after = timeit.timeit(lambda: _after(model, projected), number=args.iterations)
+        results.append({
+            "response": name,
+            "before_bytes": len(_before(raw)),
+            "after_bytes": len(_after(model, projected)),
+            "before_us": round(before / args.iterations * 1e6, 2),
+            "after_us": round(after / args.iterations * 1e6, 2),
+        })
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+"""
+Load benchmark for the login, shift and attendance endpoints.
+
+Seeds a realistic dataset (managers, staff with shifts and a history of
+attendance), then drives concurrent load against each endpoint and prints one
+JSON document with p50/p95/p99 latency, requests per second and mean
+response body size per scenario, so runs can be compared across commits.
+
+Scenarios:
+    login        POST  /api/v1/auth/login          random staff credentials
+    shift-read   GET   /api/v1/shift/              random staff tokens
+    shift-revalidate    GET /api/v1/shift/         the same, with the If-None-Match of a previous read
+    profile-read        GET /api/v1/auth/user      random staff tokens
+    profile-revalidate  GET /api/v1/auth/user      the same, with the If-None-Match of a previous read
+    shift-write  PATCH /api/v1/shift?staff_id=...  managers moving staff between shifts
+    attendance   POST  /api/v1/attendance/         steady clock-ins with distinct photos
+    burst        POST  /api/v1/attendance/         a shift start: every punch at once
+
+By default the app runs in-process (through httpx's ASGI transport, lifespan
+included) against a local mongod and moto for S3. `--mongomock` swaps mongod
+for mongomock-motor so no server is needed; use fewer `--days` with it, since
+the whole history is kept in memory. `--base-url` drives an already running
+server instead; the dataset is then seeded through DATABASE_URL and tokens are
+signed with PRIVATE_KEY, so both must match the server's settings.
+
+Settings the stand-ins need (keys, bucket, collection names) default to
+throwaway values. DATABASE_NAME is always `--database`, so a run never writes
+to the application's own database; it is dropped afterwards unless `--keep`.
+
+Needs httpx and moto, plus mongomock-motor for `--mongomock`.
+
+    python benchmarks/bench_suite.py --mongomock --staff 2000 --managers 40 --days 30
+    python benchmarks/bench_suite.py --output results/$(git rev-parse --short HEAD).json
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SCENARIOS = [
+    "login", "shift-read", "shift-revalidate", "profile-read", "profile-revalidate",
+    "shift-write", "attendance", "burst",
+]
+# Scenarios that replay a read with the ETag it returned.
+REVALIDATE = {"shift-revalidate", "profile-revalidate"}
+SHIFTS = {
+    "morning": ("08:00", "16:00"),
+    "afternoon": ("12:00", "21:00"),
+    "evening": ("16:00", "03:00"),
+    "night": ("21:00", "06:00"),
+}
+PASSWORD = "bench-password"
+EMAIL_DOMAIN = "bench.example.com"
+
+
+def _standin_environment(args):
+    """
+    Fill in the settings Utils.Config requires, before anything imports it.
+    """
+    env = os.environ
+    env["DATABASE_NAME"] = args.database
+    env.setdefault("DATABASE_URL", "mongodb://localhost:27017")
+    env.setdefault("USER_COLLECTION", "users")
+    env.setdefault("ATTENDANCE_COLLECTION", "attendance")
+    env.setdefault("SHIFT_COLLECTION", "shifts")
+    env.setdefault("TOKEN_EXPIRE_TIME", "120")
+    env.setdefault("MANAGER_SECRET_KEY", "bench-secret")
+    if args.mock_s3:
+        env.setdefault("AWS_ACCESS_KEY_ID", "bench")
+        env.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+        env.setdefault("AWS_S3_BUCKET_NAME", "attendance-bench")
+        env.setdefault("AWS_REGION", "us-east-1")
+    if not env.get("PRIVATE_KEY"):
+        from cryptography.hazmat.primitives import serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        env["PRIVATE_KEY"] = key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption(),
+        ).decode()
+        env["PUBLIC_KEY"] = key.public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo,
+        ).decode()
+
+
+def _photos(count, width, height, seed):
+    """
+    Encode `count` distinct JPEGs, so content-hash deduplication never kicks in.
+    """
+    from PIL import Image
+
+    base = Image.effect_noise((width, height), 48).convert("RGB")
+    rng = random.Random(seed)
+    photos = []
+    for _ in range(count):
+        image = base.copy()
+        for _ in range(8):
+            image.putpixel((rng.randrange(width), rng.randrange(height)), tuple(rng.randrange(256) for _ in range(3)))
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=85)
+        photos.append(buffer.getvalue())
+    return photos
+
+
+async def _seed(args, rng, now):
+    """
+    Insert managers, staff, shifts and attendance history directly into MongoDB.
+
+    Staff are split into three groups: `attendance` and `burst` staff have not
+    punched today and get a shift that is open right now (the burst group's
+    starts this minute), the rest get one of the standard shifts and serve the
+    login and shift scenarios.
+    """
+    from Utils.PasswordHasher import pwd_context
+    from database.database_connection import (
+        user_collection, shift_collection, attendance_bucket_collection, ensure_indexes,
+    )
+    from database.attendance_buckets import day_key, month_start, punch_entry
+
+    await ensure_indexes()
+    password_hash = pwd_context.hash(PASSWORD)
+    created = int(now.timestamp())
+
+    managers = [
+        {
+            "username": f"manager{m}", "password": password_hash, "role": "manager",
+            "full_name": f"Manager {m}", "email": f"manager{m}@{EMAIL_DOMAIN}",
+            "manager_secret_key": "", "manager_id": "", "created_at": created, "updated_at": created,
+        }
+        for m in range(args.managers)
+    ]
+    await user_collection.insert_many(managers)
+
+    staff = [
+        {
+            "username": f"staff{i}", "password": password_hash, "role": "staff",
+            "full_name": f"Staff {i}", "email": f"staff{i}@{EMAIL_DOMAIN}",
+            "manager_secret_key": "", "manager_id": str(managers[i % args.managers]["_id"]),
+            "created_at": created, "updated_at": created,
+        }
+        for i in range(args.staff)
+    ]
+    for start in range(0, len(staff), args.seed_batch):
+        await user_collection.insert_many(staff[start:start + args.seed_batch])
+
+    open_now = ((now - timedelta(minutes=30)).strftime("%H:%M"), (now + timedelta(hours=7)).strftime("%H:%M"))
+    starts_now = (now.strftime("%H:%M"), (now + timedelta(hours=8)).strftime("%H:%M"))
+    groups = {"attendance": [], "burst": [], "general": []}
+    shifts = []
+    for i, user in enumerate(staff):
+        if i < args.attendance_requests:
+            group, name, (start_time, end_time) = "attendance", "morning", open_now
+        elif i < args.attendance_requests + args.burst:
+            group, name, (start_time, end_time) = "burst", "morning", starts_now
+        else:
+            name = rng.choice(list(SHIFTS))
+            group, (start_time, end_time) = "general", SHIFTS[name]
+        user["shift_name"] = name
+        groups[group].append(user)
+        shifts.append({
+            "user_id": str(user["_id"]), "shift_name": name, "start_time": start_time,
+            "end_time": end_time, "created_at": created, "updated_at": created,
+        })
+    for start in range(0, len(shifts), args.seed_batch):
+        await shift_collection.insert_many(shifts[start:start + args.seed_batch])
+
+    # One punch per working day of history, never today, so every punch in the
+    # attendance scenarios is accepted. Stored as monthly buckets, the way the
+    # API writes them.
+    buckets = {}
+    for days_ago in range(args.days, 0, -1):
+        day = now - timedelta(days=days_ago)
+        if day.weekday() >= 5:
+            continue
+        for user, shift in zip(staff, shifts):
+            minutes_late = rng.randint(-10, 15)
+            punched = datetime.combine(day.date(), datetime.strptime(SHIFTS[user["shift_name"]][0], "%H:%M").time())
+            punched += timedelta(minutes=minutes_late)
+            bucket = buckets.setdefault((shift["user_id"], month_start(punched)), {
+                "user_id": shift["user_id"], "month": month_start(punched), "count": 0, "punches": {},
+            })
+            bucket["punches"][day_key(punched)] = punch_entry(punched, "", user["shift_name"], minutes_late > 0)
+            bucket["count"] += 1
+    documents = list(buckets.values())
+    for start in range(0, len(documents), args.seed_batch):
+        await attendance_bucket_collection.insert_many(documents[start:start + args.seed_batch], ordered=False)
+    history = sum(bucket["count"] for bucket in documents)
+
+    return managers, groups, history
+
+
+def _summary(scenario, latencies, statuses, sizes, seconds, concurrency):
+    ordered = sorted(latencies)
+
+    def percentile(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000, 2)
+
+    return {
+        "scenario": scenario,
+        "requests": len(ordered),
+        "concurrency": concurrency,
+        "seconds": round(seconds, 3),
+        "requests_per_second": round(len(ordered) / seconds, 1),
+        "latency_ms": {
+            "p50": percentile(50), "p95": percentile(95), "p99": percentile(99),
+            "max": round(ordered[-1] * 1000, 2),
+            "mean": round(sum(ordered) / len(ordered) * 1000, 2),
+        },
+        "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+        "response_bytes": round(sum(sizes) / len(sizes), 1),
+    }
+
+
+async def _drive(client, scenario, requests, concurrency):
+    """
+    Send `requests` (a list of (method, url, kwargs)) with `concurrency` workers.
+    """
+    latencies, statuses, sizes = [], Counter(), []
+    pending = iter(requests)
+
+    async def worker():
+        for method, url, kwargs in pending:
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] += 1
+            sizes.append(len(response.content))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, len(requests)))))
+    result = _summary(scenario, latencies, statuses, sizes, time.perf_counter() - started, concurrency)
+    print(f"{scenario}: {json.dumps(result['latency_ms'])}", file=sys.stderr)
+    return result
+
+
+async def _with_etags(client, requests):
+    """
+    Add the If-None-Match a client would send to each GET, from one untimed
+    read per distinct URL and token.
+    """
+    etags = {}
+    for method, url, kwargs in requests:
+        key = (url, kwargs["headers"]["Authorization"])
+        if key not in etags:
+            etags[key] = (await client.request(method, url, **kwargs)).headers.get("etag")
+    return [
+        (method, url, {**kwargs, "headers": {
+            **kwargs["headers"], "If-None-Match": etags[(url, kwargs["headers"]["Authorization"])] or "",
+        }})
+        for method, url, kwargs in requests
+    ]
+
+
+async def _run(client, args, plan, concurrency):
+    results = []
+    for scenario in args.scenarios:
+        requests = plan[scenario]
+        if scenario in REVALIDATE:
+            requests = await _with_etags(client, requests)
+        results.append(await _drive(client, scenario, requests, concurrency.get(scenario, args.concurrency)))
+    return results
+
+
+def _plan(args, rng, managers, groups, photos):
+    """
+    Build every scenario's request list before any timing starts.
+    """
+    from Utils.OAuth import create_access_token
+
+    def bearer(user):
+        token = create_access_token({"email": user["email"], "role": user["role"], "_id": str(user["_id"])})
+        return {"Authorization": f"Bearer {token}"}
+
+    general = groups["general"]
+    readers = rng.sample(general, min(len(general), args.token_pool))
+    reader_headers = [bearer(user) for user in readers]
+    manager_headers = {str(manager["_id"]): bearer(manager) for manager in managers}
+    names = list(SHIFTS)
+
+    plan = {scenario: [] for scenario in SCENARIOS}
+    for _ in range(args.requests):
+        user = rng.choice(general)
+        plan["login"].append(("POST", "/api/v1/auth/login", {"json": {"email": user["email"], "password": PASSWORD}}))
+        plan["shift-read"].append(("GET", "/api/v1/shift/", {"headers": rng.choice(reader_headers)}))
+        plan["shift-revalidate"].append(("GET", "/api/v1/shift/", {"headers": rng.choice(reader_headers)}))
+        plan["profile-read"].append(("GET", "/api/v1/auth/user", {"headers": rng.choice(reader_headers)}))
+        plan["profile-revalidate"].append(("GET", "/api/v1/auth/user", {"headers": rng.choice(reader_headers)}))
+
+        user = rng.choice(general)
+        user["shift_name"] = names[(names.index(user["shift_name"]) + 1) % len(names)]
+        start_time, end_time = SHIFTS[user["shift_name"]]
+        plan["shift-write"].append((
+            "PATCH", "/api/v1/shift",
+            {
+                "params": {"staff_id": str(user["_id"])},
+                "json": {"shift_name": user["shift_name"], "start_time": start_time, "end_time": end_time},
+                "headers": manager_headers[user["manager_id"]],
+            },
+        ))
+
+    photo = iter(photos)
+    for group in ("attendance", "burst"):
+        for user in groups[group]:
+            plan[group].append((
+                "POST", "/api/v1/attendance/",
+                {"files": {"image": ("punch.jpg", next(photo), "image/jpeg")}, "headers": bearer(user)},
+            ))
+    return plan
+
+
+async def main(args):
+    import httpx
+    from database import database_connection
+
+    if args.mongomock:
+        from mongomock_motor import AsyncMongoMockClient
+
+        database_connection.database_client = AsyncMongoMockClient()
+    else:
+        database_connection.connect()
+
+    rng = random.Random(args.seed)
+    now = datetime.now()
+    started = time.perf_counter()
+    managers, groups, history = await _seed(args, rng, now)
+    seed_seconds = time.perf_counter() - started
+    print(f"seeded {args.staff} staff and {history} attendance records in {seed_seconds:.1f}s", file=sys.stderr)
+
+    photos = _photos(args.attendance_requests + args.burst, args.image_width, args.image_height, args.seed)
+    plan = _plan(args, rng, managers, groups, photos)
+    concurrency = {"attendance": args.concurrency, "burst": max(1, args.burst)}
+
+    if args.base_url:
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=120) as client:
+            results = await _run(client, args, plan, concurrency)
+    else:
+        from app import app
+
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+                results = await _run(client, args, plan, concurrency)
+
+    if not args.keep and not args.mongomock:
+        await database_connection.connect().drop_database(args.database)
+    database_connection.close()
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    report = {
+        "commit": commit,
+        "started_at": now.isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "target": args.base_url or "in-process",
+        "mongo": "mongomock" if args.mongomock else "mongod",
+        "s3": "server" if args.base_url else ("moto" if args.mock_s3 else "configured"),
+        "dataset": {
+            "managers": args.managers, "staff": args.staff, "days": args.days,
+            "attendance_records": history, "seed_seconds": round(seed_seconds, 1),
+        },
+        "scenarios": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--managers", type=int, default=200)
+    parser.add_argument("--staff", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=365, help="Days of attendance history to seed.")
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per login, shift and profile scenario.")
+    parser.add_argument("--attendance-requests", type=int, default=500)
+    parser.add_argument("--burst", type=int, default=1000, help="Punches sent at once for the shift-start burst.")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--scenarios", type=lambda value: value.split(","), default=SCENARIOS)
+    parser.add_argument("--token-pool", type=int, default=1000, help="Distinct staff tokens for the shift and profile reads.")
+    parser.add_argument("--image-width", type=int, default=1280)
+    parser.add_argument("--image-height", type=int, default=960)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--seed-batch", type=int, default=10000)
+    parser.add_argument("--database", default="attendance_bench")
+    parser.add_argument("--mongomock", action="store_true", help="Use mongomock-motor instead of a mongod.")
+    parser.add_argument("--no-mock-s3", dest="mock_s3", action="store_false", help="Upload to the configured bucket.")
+    parser.add_argument("--base-url", help="Drive a running server instead of the app in-process.")
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded database.")
+    parser.add_argument("--output", help="Also write the JSON report to this file.")
+    args = parser.parse_args()
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    if args.attendance_requests + args.burst >= args.staff:
+        parser.error("--staff must exceed --attendance-requests plus --burst")
+    if args.base_url and args.mongomock:
+        parser.error("--mongomock only works with the in-process app")
+
+    _standin_environment(args)
+    if args.mock_s3 and not args.base_url:
+        from moto import mock_aws
+        import boto3
+
+        with mock_aws():
+            from Utils.Config import bucket_name, AWS_REGION
+            boto3.client("s3", region_name=AWS_REGION).create_bucket(Bucket=bucket_name)
+            asyncio.run(main(args))
+    else:
+        asyncio.run(main(args))
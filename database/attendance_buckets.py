@@ -0,0 +1,218 @@
+"""
+Attendance stored as one bucket document per user per month.
+
+    {
+        "_id": ObjectId,
+        "user_id": "<user id>",
+        "month": ISODate("2024-08-01T00:00:00"),
+        "count": 2,
+        "punches": {
+            "05": {"id": ObjectId, "t": ISODate("2024-08-05T08:02:11"), "d": ISODate("2024-08-05"),
+                   "img": "attendance_images/<sha256>.webp", "shift": "morning", "late": true},
+            "06": {..., "o": ISODate("2024-08-06T16:40:00")},
+        },
+    }
+
+Punch times are real datetimes (wall-clock time of the deployment, stored
+naive like every other timestamp in the app) instead of date and time strings.
+A punch is filed under its shift's date `d`, the day the shift started, which
+for a punch after midnight on an overnight shift is the day before `t`.
+The image is stored as its object key rather than the full URL, and the status
+is not stored because every punch is a clock-in ("Present"); a clock-out, when
+recorded, is added to its punch as `o`. A photo still being processed in the
+background is marked `img_state` "pending" ("failed" if it never could be
+stored); punches without the field have their image stored. The punch `id` is
+the attendance ID returned by the API; being an ObjectId it also carries the
+time the record was written.
+
+The unique (user_id, month) index makes a month's bucket the unit of range
+scans: a date range reads at most one small document per user per month.
+"""
+from datetime import date, datetime, timedelta
+from typing import Optional
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from database.database_connection import attendance_bucket_collection
+from Utils.Storage import object_url
+
+PRESENT = "Present"
+
+IMAGE_PENDING = "pending"
+IMAGE_STORED = "stored"
+IMAGE_FAILED = "failed"
+
+
+def month_start(day) -> datetime:
+    return datetime(day.year, day.month, 1)
+
+
+def day_key(day) -> str:
+    return f"{day.day:02d}"
+
+
+def punch_entry(punch_time: datetime, image_key: str, shift_name: str, late: bool,
+                work_date: date = None, punch_id: ObjectId = None, image_state: str = IMAGE_STORED) -> dict:
+    work_date = work_date or punch_time.date()
+    entry = {
+        "id": punch_id or ObjectId(),
+        "t": punch_time.replace(microsecond=0),
+        "d": datetime(work_date.year, work_date.month, work_date.day),
+        "img": image_key,
+        "shift": shift_name,
+        "late": late,
+    }
+    if image_state != IMAGE_STORED:
+        entry["img_state"] = image_state
+    return entry
+
+
+def punch_upsert(user_id: str, entry: dict):
+    """
+    Build the filter and update that add one punch to its month's bucket.
+
+    The filter only matches a bucket without a punch on that day, so a second
+    punch for the same day falls through to the insert branch of the upsert and
+    is rejected by the unique (user_id, month) index with a DuplicateKeyError,
+    exactly like the shift upsert. Two first punches of a month on different
+    days can also race on the insert; `retry_punch` tells the two cases apart.
+    """
+    key = day_key(entry["d"])
+    bucket_filter = {
+        "user_id": user_id,
+        "month": month_start(entry["d"]),
+        f"punches.{key}": {"$exists": False},
+    }
+    update = {"$set": {f"punches.{key}": entry}, "$inc": {"count": 1}}
+    return bucket_filter, update
+
+
+async def record_punch(user_id: str, entry: dict) -> str:
+    """
+    Store one punch. Raises DuplicateKeyError when the day is already marked.
+    """
+    bucket_filter, update = punch_upsert(user_id, entry)
+    try:
+        await attendance_bucket_collection.update_one(bucket_filter, update, upsert=True)
+    except DuplicateKeyError:
+        if not await retry_punch(user_id, entry):
+            raise
+    return str(entry["id"])
+
+
+async def retry_punch(user_id: str, entry: dict) -> bool:
+    """
+    Retry a punch whose upsert hit the unique index, without upserting.
+
+    The bucket exists by now, so this only fails (returns False) when the day
+    is already marked; otherwise another punch created the month's bucket
+    first and this one is added to it.
+    """
+    bucket_filter, update = punch_upsert(user_id, entry)
+    result = await attendance_bucket_collection.update_one(bucket_filter, update)
+    return result.matched_count == 1
+
+
+async def punch_exists(user_id: str, day: date) -> bool:
+    bucket = await attendance_bucket_collection.find_one(
+        {"user_id": user_id, "month": month_start(day), f"punches.{day_key(day)}": {"$exists": True}},
+        {"_id": 1},
+    )
+    return bucket is not None
+
+
+async def latest_punch(user_id: str, now: datetime, max_age: timedelta) -> Optional[dict]:
+    """
+    Return the user's most recent punch taken within `max_age` before `now`, or None.
+    """
+    since = now - max_age
+    buckets = attendance_bucket_collection.find(
+        {"user_id": user_id, "month": {"$in": list({month_start(since), month_start(now)})}},
+        {"_id": 0, "punches": 1},
+    )
+    punches = [
+        punch
+        async for bucket in buckets
+        for punch in bucket["punches"].values()
+        if since <= punch["t"] <= now
+    ]
+    return max(punches, key=lambda punch: punch["t"], default=None)
+
+
+async def record_clock_out(user_id: str, entry: dict, out_time: datetime) -> bool:
+    """
+    Add a clock-out to a punch. Returns False when the punch already has one.
+    """
+    key = day_key(entry["d"])
+    result = await attendance_bucket_collection.update_one(
+        {
+            "user_id": user_id,
+            "month": month_start(entry["d"]),
+            f"punches.{key}.id": entry["id"],
+            f"punches.{key}.o": {"$exists": False},
+        },
+        {"$set": {f"punches.{key}.o": out_time.replace(microsecond=0)}},
+    )
+    return result.modified_count == 1
+
+
+async def set_image_state(user_id: str, day: datetime, punch_id: ObjectId, image_state: str) -> bool:
+    """
+    Update the image state of one punch. Returns False when the punch does not exist.
+    """
+    key = day_key(day)
+    result = await attendance_bucket_collection.update_one(
+        {"user_id": user_id, "month": month_start(day), f"punches.{key}.id": punch_id},
+        {"$set": {f"punches.{key}.img_state": image_state}},
+    )
+    return result.matched_count == 1
+
+
+def month_match(start_date: date, end_date: date) -> dict:
+    return {"month": {"$gte": month_start(start_date), "$lte": month_start(end_date)}}
+
+
+def image_url_expression(field: str) -> dict:
+    """
+    Aggregation expression turning a stored image key into its URL.
+
+    Records migrated from the old layout whose URL did not match this
+    deployment's bucket keep the URL itself, which is passed through.
+    """
+    return {"$cond": [
+        {"$regexMatch": {"input": field, "regex": "^https?://"}},
+        field,
+        {"$concat": [object_url(""), field]},
+    ]}
+
+
+def flatten_punches(start_date: date, end_date: date) -> list:
+    """
+    Stages turning bucket documents into one document per punch in a date range.
+
+    Each output document has the old record's fields: `attendance_id`,
+    `user_id`, `date` (the shift's date) and `time_in` strings, `status`,
+    `image` (a URL), `shift_name` and `late`, plus the punch time as `t` and
+    `image_state`. The
+    range applies to shift dates. Run after a `$match` on `month_match()` so
+    only the range's buckets are read.
+    """
+    return [
+        {"$project": {"_id": 0, "user_id": 1, "punch": {"$objectToArray": "$punches"}}},
+        {"$unwind": "$punch"},
+        {"$match": {"punch.v.d": {
+            "$gte": datetime.combine(start_date, datetime.min.time()),
+            "$lte": datetime.combine(end_date, datetime.min.time()),
+        }}},
+        {"$project": {
+            "attendance_id": {"$toString": "$punch.v.id"},
+            "user_id": 1,
+            "t": "$punch.v.t",
+            "date": {"$dateToString": {"format": "%Y-%m-%d", "date": "$punch.v.d"}},
+            "time_in": {"$dateToString": {"format": "%H:%M:%S", "date": "$punch.v.t"}},
+            "status": {"$literal": PRESENT},
+            "image": image_url_expression("$punch.v.img"),
+            "image_state": {"$ifNull": ["$punch.v.img_state", IMAGE_STORED]},
+            "shift_name": "$punch.v.shift",
+            "late": "$punch.v.late",
+        }},
+    ]
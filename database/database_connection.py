@@ -1,9 +1,109 @@
-from Utils.Config import database_name,database_url, user_collection_name, attendance_collection_name, shift_collection_name
-from pymongo import MongoClient
+from Utils.Config import (
+    database_name,
+    database_url,
+    user_collection_name,
+    attendance_collection_name,
+    attendance_bucket_collection_name,
+    shift_collection_name,
+    rollup_collection_name,
+    idempotency_collection_name,
+    outbox_collection_name,
+    MONGO_MAX_POOL_SIZE,
+    MONGO_MIN_POOL_SIZE,
+    MONGO_MAX_IDLE_TIME_MS,
+    MONGO_WAIT_QUEUE_TIMEOUT_MS,
+    MONGO_CONNECT_TIMEOUT_MS,
+    MONGO_SOCKET_TIMEOUT_MS,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    MONGO_READ_PREFERENCE,
+)
+from motor.motor_asyncio import AsyncIOMotorClient
+from Utils.Metrics import MongoCommandMetrics
 
+# One pooled client per worker process. It is created by `connect()` from the
+# app lifespan (or on first use, for scripts) rather than at import time, so a
+# forked worker never inherits another process's sockets and importing the
+# package never opens connections.
+database_client = None
 
-database_connection = MongoClient(database_url)[database_name]
 
-user_collection = database_connection.get_collection(user_collection_name)
-attendance_collection = database_connection.get_collection(attendance_collection_name)
-shift_collection = database_connection.get_collection(shift_collection_name)
\ No newline at end of file
+def connect():
+    """
+    Create this process's MongoDB client if it does not exist yet.
+    """
+    global database_client
+    if database_client is None:
+        database_client = AsyncIOMotorClient(
+            database_url,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            minPoolSize=MONGO_MIN_POOL_SIZE,
+            maxIdleTimeMS=MONGO_MAX_IDLE_TIME_MS,
+            waitQueueTimeoutMS=MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+            socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+            serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            readPreference=MONGO_READ_PREFERENCE,
+            event_listeners=[MongoCommandMetrics()],
+        )
+    return database_client
+
+
+def close():
+    """
+    Close this process's MongoDB client and its connection pool.
+    """
+    global database_client
+    if database_client is not None:
+        database_client.close()
+        database_client = None
+
+
+def get_database():
+    return connect()[database_name]
+
+
+class LazyCollection:
+    """
+    Stand-in for a motor collection that resolves against the current client.
+
+    Modules import the collections below at import time; every attribute access
+    is forwarded to the real collection of whichever client `connect()` created
+    in this process.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __getattr__(self, attribute):
+        return getattr(get_database()[self.name], attribute)
+
+
+user_collection = LazyCollection(user_collection_name)
+# Legacy one-document-per-punch attendance, only read by database.migrate_attendance.
+attendance_collection = LazyCollection(attendance_collection_name)
+attendance_bucket_collection = LazyCollection(attendance_bucket_collection_name)
+shift_collection = LazyCollection(shift_collection_name)
+rollup_collection = LazyCollection(rollup_collection_name)
+idempotency_collection = LazyCollection(idempotency_collection_name)
+outbox_collection = LazyCollection(outbox_collection_name)
+
+
+async def ensure_indexes():
+    """
+    Create the indexes the application relies on.
+
+    The unique indexes double as integrity constraints: writes are issued
+    directly and a `DuplicateKeyError` stands in for the old check-then-write
+    lookups. `create_index` is a no-op when the index already exists, so this is
+    safe to run on every startup.
+    """
+    await user_collection.create_index("email", unique=True)
+    await user_collection.create_index([("manager_id", 1), ("role", 1)])
+    await shift_collection.create_index("user_id", unique=True)
+    await attendance_bucket_collection.create_index([("user_id", 1), ("month", 1)], unique=True)
+    await rollup_collection.create_index(
+        [("manager_id", 1), ("date", 1), ("shift_name", 1)], unique=True
+    )
+    await idempotency_collection.create_index([("user_id", 1), ("key", 1)], unique=True)
+    await idempotency_collection.create_index("expires_at", expireAfterSeconds=0)
+    await outbox_collection.create_index([("status", 1), ("run_at", 1)])
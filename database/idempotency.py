@@ -0,0 +1,152 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException, status
+from fastapi.responses import ORJSONResponse
+from pymongo.errors import DuplicateKeyError
+from Utils.Config import IDEMPOTENCY_TTL, IDEMPOTENCY_WAIT_SECONDS, IDEMPOTENCY_LOCK_TIMEOUT
+from database.database_connection import idempotency_collection
+
+MAX_KEY_LENGTH = 255
+_POLL_INTERVAL = 0.05
+
+# Errors a retry could get past (rate limiting, timeouts, any 5xx) release the
+# key so the retry runs the request again. Every other outcome is stored and
+# replayed.
+_RETRYABLE = {status.HTTP_408_REQUEST_TIMEOUT, status.HTTP_429_TOO_MANY_REQUESTS}
+
+# Response headers describing how this particular execution went; not replayed.
+_NOT_REPLAYED = {"server-timing"}
+
+# Requests holding a key in this process, keyed by (user_id, key). Duplicates
+# arriving here wait on the owner's future instead of polling MongoDB.
+_owned = {}
+
+
+def _replay(stored: dict):
+    headers = {**stored["headers"], "Idempotent-Replayed": "true"}
+    return ORJSONResponse(stored["body"], status_code=stored["status_code"], headers=headers)
+
+
+def _stored_response(status_code: int, body, headers: dict) -> dict:
+    return {
+        "status_code": status_code,
+        "body": body,
+        "headers": {name: value for name, value in (headers or {}).items() if name.lower() not in _NOT_REPLAYED},
+    }
+
+
+async def _claim(user_id: str, key: str, scope: str):
+    """
+    Try to take the key. Returns None when this request now owns it, otherwise
+    the record of whichever request got there first.
+    """
+    now = time.time()
+    try:
+        await idempotency_collection.insert_one({
+            "user_id": user_id,
+            "key": key,
+            "scope": scope,
+            "status": "pending",
+            "claimed_at": now,
+            "expires_at": datetime.now(timezone.utc) + timedelta(seconds=IDEMPOTENCY_TTL),
+        })
+        return None
+    except DuplicateKeyError:
+        pass
+    record = await idempotency_collection.find_one({"user_id": user_id, "key": key})
+    if record is None:
+        # Released or expired in between; the next attempt will insert.
+        return {"status": "released", "scope": scope}
+    if record["status"] == "pending" and record["claimed_at"] < now - IDEMPOTENCY_LOCK_TIMEOUT:
+        # The owner died without finishing; take over its claim.
+        taken = await idempotency_collection.update_one(
+            {"_id": record["_id"], "status": "pending", "claimed_at": record["claimed_at"]},
+            {"$set": {"claimed_at": now}},
+        )
+        if taken.modified_count:
+            return None
+    return record
+
+
+async def run(user_id: str, key: str, scope: str, handler, status_code: int = status.HTTP_200_OK):
+    """
+    Run `handler` at most once per (user, Idempotency-Key) and replay its response.
+
+    `handler` is an async callable returning `(body, headers)` or raising
+    `HTTPException`. The first request with a key records a pending claim
+    under the unique (user_id, key) index, runs the handler and stores the
+    response for `IDEMPOTENCY_TTL` seconds. Retries get the stored response
+    back, marked with `Idempotent-Replayed: true`, without running the
+    handler. Concurrent duplicates wait for the first request to finish (up to
+    `IDEMPOTENCY_WAIT_SECONDS`, then 409). A key reused on a different
+    endpoint is rejected with 422.
+    """
+    if not key or len(key) > MAX_KEY_LENGTH or not key.isprintable():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} printable characters.",
+        )
+
+    owner_key = (user_id, key)
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        local = _owned.get(owner_key)
+        if local is not None:
+            try:
+                stored = await asyncio.wait_for(asyncio.shield(local), max(0.0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                stored = None
+            if stored is not None:
+                return _replay(stored)
+        else:
+            future = asyncio.get_running_loop().create_future()
+            _owned[owner_key] = future
+            try:
+                record = await _claim(user_id, key, scope)
+            except BaseException:
+                _owned.pop(owner_key, None)
+                future.set_result(None)
+                raise
+            if record is None:
+                break
+            _owned.pop(owner_key, None)
+            future.set_result(None)
+            if record["scope"] != scope:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    detail="This Idempotency-Key was already used for a different request.",
+                )
+            if record["status"] == "completed":
+                return _replay(record["response"])
+
+        if time.monotonic() >= deadline:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key is still in progress.",
+                headers={"Retry-After": "1"},
+            )
+        if local is None:
+            await asyncio.sleep(_POLL_INTERVAL)
+
+    stored = None
+    try:
+        try:
+            body, headers = await handler()
+        except HTTPException as e:
+            if e.status_code >= 500 or e.status_code in _RETRYABLE:
+                raise
+            stored = _stored_response(e.status_code, {"detail": e.detail}, e.headers)
+            raise
+        stored = _stored_response(status_code, body, headers)
+        return ORJSONResponse(body, status_code=status_code, headers=headers)
+    finally:
+        _owned.pop(owner_key, None)
+        future.set_result(stored)
+        if stored is None:
+            await idempotency_collection.delete_one({"user_id": user_id, "key": key, "status": "pending"})
+        else:
+            await idempotency_collection.update_one(
+                {"user_id": user_id, "key": key},
+                {"$set": {"status": "completed", "response": stored}},
+            )
@@ -0,0 +1,107 @@
+import argparse
+import asyncio
+from datetime import datetime
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from database.database_connection import (
+    attendance_collection,
+    attendance_bucket_collection,
+    get_database,
+    ensure_indexes,
+)
+from database.attendance_buckets import PRESENT, punch_entry, punch_upsert, retry_punch
+from Utils.Storage import object_url
+
+MIGRATION_ID = "attendance_buckets"
+
+
+def _image_key(url: str) -> str:
+    prefix = object_url("")
+    return url[len(prefix):] if url and url.startswith(prefix) else url
+
+
+def convert(record: dict):
+    """
+    Turn one old attendance document into `(user_id, punch entry)`, or None if
+    it cannot be converted. The punch keeps the old document's `_id` as its
+    attendance ID.
+    """
+    if record.get("status", PRESENT) != PRESENT or not record.get("user_id"):
+        return None
+    try:
+        punch_time = datetime.strptime(f"{record['date']} {record['time_in']}", "%Y-%m-%d %H:%M:%S")
+    except (KeyError, TypeError, ValueError):
+        return None
+    entry = punch_entry(
+        punch_time, _image_key(record.get("image", "")), record.get("shift_name"),
+        record.get("late"), punch_id=record["_id"],
+    )
+    return record["user_id"], entry
+
+
+async def migrate(batch_size: int, restart: bool = False):
+    """
+    Copy attendance documents into monthly buckets, one batch at a time.
+
+    Documents are read in `_id` order and the last migrated `_id` is saved in
+    the `migrations` collection after every batch, so an interrupted run picks
+    up where it stopped. Re-running a batch is harmless: a punch already in its
+    bucket fails the upsert's duplicate check and is counted as existing. A
+    duplicate key can also mean another write created the month's bucket
+    first; those punches are retried into it, as the batch route does. The
+    old collection is left untouched.
+    """
+    await ensure_indexes()
+    migrations = get_database()["migrations"]
+    if restart:
+        await migrations.delete_one({"_id": MIGRATION_ID})
+    state = await migrations.find_one({"_id": MIGRATION_ID}) or {
+        "_id": MIGRATION_ID, "last_id": None, "migrated": 0, "existing": 0, "skipped": 0,
+    }
+
+    while True:
+        query = {} if state["last_id"] is None else {"_id": {"$gt": state["last_id"]}}
+        records = await attendance_collection.find(query).sort("_id", 1).limit(batch_size).to_list(None)
+        if not records:
+            break
+
+        punches = []
+        for record in records:
+            converted = convert(record)
+            if converted is None:
+                state["skipped"] += 1
+            else:
+                punches.append(converted)
+
+        existing = 0
+        if punches:
+            operations = [UpdateOne(*punch_upsert(*punch), upsert=True) for punch in punches]
+            try:
+                await attendance_bucket_collection.bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                if any(error.get("code") != 11000 for error in errors):
+                    raise
+                for error in errors:
+                    if not await retry_punch(*punches[error["index"]]):
+                        existing += 1
+        state["migrated"] += len(punches) - existing
+        state["existing"] += existing
+        state["last_id"] = records[-1]["_id"]
+        state["updated_at"] = datetime.now()
+        await migrations.replace_one({"_id": MIGRATION_ID}, state, upsert=True)
+        print(
+            f"migrated={state['migrated']} existing={state['existing']} "
+            f"skipped={state['skipped']} last_id={state['last_id']}"
+        )
+
+    return state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate attendance records into monthly bucket documents.")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--restart", action="store_true", help="Ignore the saved checkpoint and start over.")
+    args = parser.parse_args()
+    state = asyncio.run(migrate(args.batch_size, args.restart))
+    print(f"Done: {state['migrated']} migrated, {state['existing']} already present, {state['skipped']} skipped.")
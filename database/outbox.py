@@ -0,0 +1,250 @@
+import argparse
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ReturnDocument
+from Utils.Config import (
+    OUTBOX_WORKERS,
+    OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_BACKOFF_BASE,
+    OUTBOX_BACKOFF_MAX,
+    OUTBOX_LEASE_SECONDS,
+    OUTBOX_HANDOFF_SECONDS,
+    OUTBOX_POLL_INTERVAL,
+    OUTBOX_METRICS_INTERVAL,
+)
+from Utils.Metrics import OUTBOX_TASKS, OUTBOX_TASK_DURATION, OUTBOX_TASK_LAG
+from database.database_connection import outbox_collection
+
+# Background tasks are documents in the outbox collection:
+#
+#     {_id, type, payload, status: "queued" | "running" | "dead", attempts,
+#      created_at, run_at, last_error}
+#
+# `run_at` is when the task may next be claimed by any worker: its scheduled
+# time while queued, the end of its lease while running. A task enqueued by a
+# request is reserved for OUTBOX_HANDOFF_SECONDS and dispatched to this
+# process's workers directly, so it normally runs at once without a poll; if
+# the process dies first, any worker picks it up once the reservation ends.
+# A finished task is deleted; one that keeps failing is kept as "dead" until
+# it is requeued. Payloads stay small: large inputs are stored elsewhere and
+# referenced by key, so a dead task still has everything it needs to rerun.
+# Handlers may run more than once (a retry after a crash, an expired lease) and
+# must be idempotent.
+
+logger = logging.getLogger("attendance.outbox")
+
+STATUSES = ("queued", "running", "dead")
+
+_handlers = {}
+_ready = None
+_stopping = None
+_workers = []
+_monitor = None
+
+
+class DeadLetter(Exception):
+    """
+    Raised by a handler when retrying cannot help; the task is dead-lettered at once.
+    """
+
+
+def register(task_type: str, handler, on_dead=None):
+    """
+    Register the coroutine function that runs tasks of `task_type`.
+
+    `handler(payload)` raises to have the task retried with exponential
+    backoff, up to OUTBOX_MAX_ATTEMPTS attempts. `on_dead(payload)`, if given,
+    runs once when the task is dead-lettered.
+    """
+    _handlers[task_type] = (handler, on_dead)
+
+
+async def enqueue(task_type: str, payload: dict) -> ObjectId:
+    """
+    Store a task durably and return its ID. Call `dispatch` once the work it
+    belongs to is committed to run it straight away in this process.
+    """
+    now = datetime.now()
+    task_id = ObjectId()
+    await outbox_collection.insert_one({
+        "_id": task_id,
+        "type": task_type,
+        "payload": payload,
+        "status": "queued",
+        "attempts": 0,
+        "created_at": now,
+        "run_at": now + timedelta(seconds=OUTBOX_HANDOFF_SECONDS),
+    })
+    return task_id
+
+
+def dispatch(task_id: ObjectId):
+    """
+    Hand a task enqueued by this process to the local workers.
+    """
+    if _ready is not None:
+        _ready.put_nowait(task_id)
+
+
+async def discard(task_id: ObjectId):
+    """
+    Drop a queued task whose work was abandoned before it was dispatched.
+    """
+    await outbox_collection.delete_one({"_id": task_id, "status": "queued"})
+
+
+async def _claim(task_id: ObjectId = None):
+    now = datetime.now()
+    if task_id is not None:
+        query, sort = {"_id": task_id, "status": "queued"}, None
+    else:
+        query, sort = {"status": {"$in": ["queued", "running"]}, "run_at": {"$lte": now}}, [("run_at", 1)]
+    return await outbox_collection.find_one_and_update(
+        query,
+        {"$set": {"status": "running", "run_at": now + timedelta(seconds=OUTBOX_LEASE_SECONDS)}, "$inc": {"attempts": 1}},
+        sort=sort,
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def backoff(attempts: int) -> float:
+    """
+    Seconds to wait before retrying after `attempts` failed attempts, with jitter.
+    """
+    delay = min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1))
+    return random.uniform(delay / 2, delay)
+
+
+async def _run(task: dict):
+    handler, on_dead = _handlers.get(task["type"], (None, None))
+    started = time.perf_counter()
+    try:
+        if handler is None:
+            raise DeadLetter(f"No handler registered for {task['type']!r}")
+        await handler(task["payload"])
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        dead = isinstance(e, DeadLetter) or task["attempts"] >= OUTBOX_MAX_ATTEMPTS
+        OUTBOX_TASK_DURATION.labels(task["type"], "dead" if dead else "retry").observe(time.perf_counter() - started)
+        log = {"task_id": str(task["_id"]), "task": task["type"], "attempts": task["attempts"], "error": repr(e)}
+        if not dead:
+            delay = backoff(task["attempts"])
+            await outbox_collection.update_one(
+                {"_id": task["_id"]},
+                {"$set": {"status": "queued", "run_at": datetime.now() + timedelta(seconds=delay), "last_error": repr(e)}},
+            )
+            logger.warning("Background task failed; retrying", extra={**log, "retry_in": round(delay, 1)})
+            return
+        await outbox_collection.update_one(
+            {"_id": task["_id"]},
+            {
+                "$set": {"status": "dead", "last_error": repr(e), "dead_at": datetime.now()},
+                "$unset": {"run_at": ""},
+            },
+        )
+        logger.error("Background task dead-lettered", extra=log)
+        if on_dead is not None:
+            try:
+                await on_dead(task["payload"])
+            except Exception:
+                logger.exception("Dead-letter hook failed", extra=log)
+        return
+    OUTBOX_TASK_DURATION.labels(task["type"], "done").observe(time.perf_counter() - started)
+    OUTBOX_TASK_LAG.labels(task["type"]).observe((datetime.now() - task["created_at"]).total_seconds())
+    await outbox_collection.delete_one({"_id": task["_id"]})
+
+
+async def _worker():
+    poll = False
+    while not _stopping.is_set():
+        try:
+            if poll:
+                task_id = None if _ready.empty() else _ready.get_nowait()
+            else:
+                try:
+                    task_id = await asyncio.wait_for(_ready.get(), OUTBOX_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    task_id = None
+            task = await _claim(task_id)
+            if task is not None:
+                await _run(task)
+            # Keep claiming while the collection has due tasks; otherwise wait
+            # for a dispatch or the next poll.
+            poll = task_id is None and task is not None
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Background task worker error")
+            poll = False
+            await asyncio.sleep(OUTBOX_POLL_INTERVAL)
+
+
+async def _sample_depth():
+    while True:
+        try:
+            counts = dict.fromkeys(STATUSES, 0)
+            async for row in outbox_collection.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+                counts[row["_id"]] = row["count"]
+            for status, count in counts.items():
+                OUTBOX_TASKS.labels(status).set(count)
+        except Exception:
+            logger.exception("Could not sample the outbox depth")
+        await asyncio.sleep(OUTBOX_METRICS_INTERVAL)
+
+
+def start(workers: int = OUTBOX_WORKERS):
+    """
+    Start this process's background workers. Called from the app lifespan.
+    """
+    global _ready, _stopping, _monitor
+    _ready = asyncio.Queue()
+    _stopping = asyncio.Event()
+    _workers.extend(asyncio.create_task(_worker()) for _ in range(workers))
+    _monitor = asyncio.create_task(_sample_depth())
+
+
+async def stop(timeout: float = 10):
+    """
+    Let running tasks finish for up to `timeout` seconds, then cancel the rest.
+
+    A cancelled task stays "running" until its lease ends and is then retried
+    by any worker.
+    """
+    global _ready, _monitor
+    if _stopping is None:
+        return
+    _stopping.set()
+    _monitor.cancel()
+    if _workers:
+        _, pending = await asyncio.wait(_workers, timeout=timeout)
+        for worker in pending:
+            worker.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    _workers.clear()
+    _ready, _monitor = None, None
+
+
+async def requeue_dead(task_type: str = None) -> int:
+    """
+    Put dead-lettered tasks back in the queue with a fresh set of attempts.
+    """
+    query = {"status": "dead"}
+    if task_type:
+        query["type"] = task_type
+    result = await outbox_collection.update_many(
+        query, {"$set": {"status": "queued", "attempts": 0, "run_at": datetime.now()}},
+    )
+    return result.modified_count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Requeue dead-lettered background tasks.")
+    parser.add_argument("--type", help="Only requeue tasks of this type.")
+    args = parser.parse_args()
+    requeued = asyncio.run(requeue_dead(args.type))
+    print(f"Requeued {requeued} dead-lettered tasks.")
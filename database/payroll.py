@@ -0,0 +1,267 @@
+import argparse
+import asyncio
+import csv
+import os
+from datetime import date, datetime
+import numpy as np
+from Utils.Config import (
+    attendance_bucket_collection_name,
+    shift_collection_name,
+    LATE_GRACE_MINUTES,
+    PAYROLL_CHUNK_SIZE,
+    REPORT_CURSOR_BATCH_SIZE,
+)
+from Utils.ShiftCalendar import SHIFT_WINDOWS, shift_minutes
+from database.database_connection import user_collection
+
+PAYROLL_FIELDS = [
+    "manager_id", "user_id", "username", "full_name", "email", "shift_name",
+    "days_present", "days_late", "late_minutes", "early_departures", "early_departure_minutes",
+    "overtime_minutes", "worked_minutes", "missing_clock_outs",
+]
+
+_MINUTE = 60 * 1000
+
+
+def payroll_pipeline(month: datetime):
+    """
+    Aggregation yielding every managed staff member with their shift and the
+    month's punches, sorted by manager so each manager's rows arrive together.
+    """
+    return [
+        {"$match": {"role": "staff", "manager_id": {"$nin": [None, ""]}}},
+        {"$sort": {"manager_id": 1, "_id": 1}},
+        {"$project": {
+            "user_id": {"$toString": "$_id"}, "manager_id": 1, "username": 1, "full_name": 1, "email": 1,
+        }},
+        {"$lookup": {
+            "from": shift_collection_name,
+            "localField": "user_id",
+            "foreignField": "user_id",
+            "pipeline": [{"$project": {"_id": 0, "shift_name": 1, "start_time": 1, "end_time": 1}}],
+            "as": "shift",
+        }},
+        {"$lookup": {
+            "from": attendance_bucket_collection_name,
+            "localField": "user_id",
+            "foreignField": "user_id",
+            "pipeline": [
+                {"$match": {"month": month}},
+                {"$project": {"_id": 0, "punches": 1}},
+            ],
+            "as": "bucket",
+        }},
+        {"$project": {
+            "_id": 0, "user_id": 1, "manager_id": 1, "username": 1, "full_name": 1, "email": 1,
+            "shift": {"$first": "$shift"},
+            # [shift name, shift date, clock-in, clock-out] per punch, with the
+            # dates as epoch milliseconds so the client decodes plain numbers.
+            "punches": {"$map": {
+                "input": {"$objectToArray": {"$ifNull": [{"$first": "$bucket.punches"}, {}]}},
+                "as": "punch",
+                "in": [
+                    "$$punch.v.shift",
+                    {"$toLong": "$$punch.v.d"},
+                    {"$toLong": "$$punch.v.t"},
+                    {"$toLong": "$$punch.v.o"},
+                ],
+            }},
+        }},
+    ]
+
+
+def punch_columns(staff: list) -> dict:
+    """
+    Flatten the punches of a chunk of staff into columnar arrays.
+
+    `staff` holds documents from `payroll_pipeline`. Each punch becomes one
+    row: the index of its staff member, the shift date, clock-in and
+    clock-out (NaN when missing) in epoch milliseconds, and the shift's start
+    and length in milliseconds. A punch taken on another shift than the
+    user's current one (a rotation) uses that shift's standard window, and
+    punches that predate `shift_name` on attendance use the current shift.
+    A punch whose shift cannot be resolved gets NaN shift times, so it counts
+    as present but never as late, early or overtime.
+    """
+    standard = {name: shift_minutes(*times) for name, times in SHIFT_WINDOWS.items()}
+    unknown = (np.nan, np.nan)
+    counts, days, ins, outs, starts, lengths = [], [], [], [], [], []
+    for member in staff:
+        punches = member.get("punches") or []
+        counts.append(len(punches))
+        if not punches:
+            continue
+        windows = standard
+        shift = member.get("shift")
+        if shift:
+            own = shift_minutes(shift["start_time"], shift["end_time"])
+            windows = {**standard, None: own, shift["shift_name"]: own}
+        names, member_days, member_ins, member_outs = zip(*punches)
+        days.extend(member_days)
+        ins.extend(member_ins)
+        outs.extend(member_outs)
+        for start, length in (windows.get(name, unknown) for name in names):
+            starts.append(start)
+            lengths.append(length)
+    return {
+        "row": np.repeat(np.arange(len(staff)), counts),
+        "day": np.array(days, dtype=np.float64),
+        "in": np.array(ins, dtype=np.float64),
+        "out": np.array(outs, dtype=np.float64),
+        "start": np.array(starts, dtype=np.float64) * _MINUTE,
+        "length": np.array(lengths, dtype=np.float64) * _MINUTE,
+    }
+
+
+def summarize(columns: dict, staff_count: int) -> dict:
+    """
+    Compute per-staff payroll totals from punch columns, without a Python loop.
+
+    A punch is late when it is more than `LATE_GRACE_MINUTES` after the shift
+    start, and its lateness is counted from the start. A clock-out before the
+    shift end is an early departure, one after it is overtime; punches without
+    a clock-out are counted as missing ones and add no worked time.
+    """
+    shift_start = columns["day"] + columns["start"]
+    shift_end = shift_start + columns["length"]
+    late = (columns["in"] - shift_start) / _MINUTE
+    late_minutes = np.where(late > LATE_GRACE_MINUTES, late, 0)
+
+    clocked_out = ~np.isnan(columns["out"])
+    past_end = (columns["out"] - shift_end) / _MINUTE
+    worked = np.where(clocked_out, (columns["out"] - columns["in"]) / _MINUTE, 0)
+
+    def total(weights=None):
+        return np.bincount(columns["row"], weights=weights, minlength=staff_count)
+
+    return {
+        "days_present": total(),
+        "days_late": total(late_minutes > 0),
+        "late_minutes": total(late_minutes),
+        "early_departures": total(past_end < 0),
+        "early_departure_minutes": total(np.where(past_end < 0, -past_end, 0)),
+        "overtime_minutes": total(np.where(past_end > 0, past_end, 0)),
+        "worked_minutes": total(worked),
+        "missing_clock_outs": total(~clocked_out),
+    }
+
+
+def payroll_rows(staff: list) -> list:
+    """
+    Payroll rows, in `PAYROLL_FIELDS` order, for a chunk of staff.
+    """
+    totals = summarize(punch_columns(staff), len(staff))
+    columns = [np.rint(totals[field]).astype(np.int64).tolist() for field in PAYROLL_FIELDS[6:]]
+    return [
+        [
+            member["manager_id"], member["user_id"], member.get("username"), member.get("full_name"),
+            member.get("email"), (member.get("shift") or {}).get("shift_name"), *values,
+        ]
+        for member, values in zip(staff, zip(*columns))
+    ]
+
+
+class CsvExport:
+    extension = "csv"
+
+    def __init__(self, path: str):
+        self._file = open(path, "w", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(PAYROLL_FIELDS)
+
+    def write(self, rows: list):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetExport:
+    extension = "parquet"
+
+    def __init__(self, path: str):
+        # pyarrow is only needed for Parquet exports and is not a requirement of the API.
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise SystemExit("Parquet export needs pyarrow: pip install pyarrow")
+        self._pyarrow = pyarrow
+        self._schema = pyarrow.schema(
+            [(field, pyarrow.string()) for field in PAYROLL_FIELDS[:6]]
+            + [(field, pyarrow.int64()) for field in PAYROLL_FIELDS[6:]]
+        )
+        self._writer = pyarrow.parquet.ParquetWriter(path, self._schema)
+
+    def write(self, rows: list):
+        columns = dict(zip(PAYROLL_FIELDS, map(list, zip(*rows))))
+        self._writer.write_table(self._pyarrow.Table.from_pydict(columns, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+EXPORTS = {"csv": CsvExport, "parquet": ParquetExport}
+
+
+async def export_payroll(month: date, output_dir: str, export_format: str = "csv",
+                         chunk_size: int = PAYROLL_CHUNK_SIZE) -> dict:
+    """
+    Write one payroll export per manager for a month. Returns rows written per manager.
+
+    Staff stream from a single aggregation cursor, sorted by manager, and are
+    processed `chunk_size` at a time, so memory stays bounded by the chunk
+    rather than the month. Each manager's rows go to
+    `payroll_<YYYY-MM>_<manager_id>.<format>` in `output_dir`; only one export
+    file is open at a time.
+    """
+    month_start = datetime(month.year, month.month, 1)
+    export_class = EXPORTS[export_format]
+    os.makedirs(output_dir, exist_ok=True)
+    written = {}
+    export, export_manager = None, None
+
+    def flush(staff):
+        nonlocal export, export_manager
+        rows = payroll_rows(staff)
+        start = 0
+        # Rows are sorted by manager; split the chunk at each manager change.
+        for end in range(1, len(rows) + 1):
+            if end < len(rows) and rows[end][0] == rows[start][0]:
+                continue
+            manager_id = rows[start][0]
+            if manager_id != export_manager:
+                if export is not None:
+                    export.close()
+                filename = f"payroll_{month_start:%Y-%m}_{manager_id}.{export_class.extension}"
+                export, export_manager = export_class(os.path.join(output_dir, filename)), manager_id
+            export.write(rows[start:end])
+            written[manager_id] = written.get(manager_id, 0) + end - start
+            start = end
+
+    cursor = user_collection.aggregate(payroll_pipeline(month_start), batchSize=REPORT_CURSOR_BATCH_SIZE)
+    staff = []
+    try:
+        async for member in cursor:
+            staff.append(member)
+            if len(staff) >= chunk_size:
+                flush(staff)
+                staff = []
+        if staff:
+            flush(staff)
+    finally:
+        if export is not None:
+            export.close()
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a month of lateness, early departures and overtime per manager.")
+    parser.add_argument("--month", type=lambda value: datetime.strptime(value, "%Y-%m").date(), required=True,
+                        help="Month to export, as YYYY-MM.")
+    parser.add_argument("--output-dir", default="payroll")
+    parser.add_argument("--format", choices=sorted(EXPORTS), default="csv")
+    parser.add_argument("--chunk-size", type=int, default=PAYROLL_CHUNK_SIZE)
+    args = parser.parse_args()
+    written = asyncio.run(export_payroll(args.month, args.output_dir, args.format, args.chunk_size))
+    print(f"Wrote payroll for {sum(written.values())} staff across {len(written)} managers to {args.output_dir}.")
@@ -0,0 +1,137 @@
+import argparse
+import asyncio
+from collections import Counter
+from datetime import date, datetime
+from pymongo import UpdateOne
+from Utils.Config import rollup_collection_name, user_collection_name, shift_collection_name
+from database.database_connection import attendance_bucket_collection, rollup_collection
+from database.attendance_buckets import month_match, flatten_punches
+
+
+def _rollup_update(present: int, late: int, now: datetime):
+    return {
+        "$inc": {"present": present, "late": late},
+        "$set": {"updated_at": now},
+    }
+
+
+async def record_attendance(manager_id: str, day: str, shift_name: str, late: bool):
+    """
+    Count one attendance record in its (manager_id, date, shift_name) rollup.
+    """
+    if not manager_id:
+        return
+    await rollup_collection.update_one(
+        {"manager_id": manager_id, "date": day, "shift_name": shift_name},
+        _rollup_update(1, int(late), datetime.now()),
+        upsert=True,
+    )
+
+
+async def record_attendance_many(records):
+    """
+    Count several attendance records with one bulk write.
+
+    `records` is an iterable of `(manager_id, date, shift_name, late)` tuples;
+    records for the same rollup are merged into a single increment.
+    """
+    present, late = Counter(), Counter()
+    for manager_id, day, shift_name, is_late in records:
+        if manager_id:
+            present[(manager_id, day, shift_name)] += 1
+            late[(manager_id, day, shift_name)] += int(is_late)
+    if not present:
+        return
+    now = datetime.now()
+    await rollup_collection.bulk_write(
+        [
+            UpdateOne(
+                {"manager_id": manager_id, "date": day, "shift_name": shift_name},
+                _rollup_update(count, late[(manager_id, day, shift_name)], now),
+                upsert=True,
+            )
+            for (manager_id, day, shift_name), count in present.items()
+        ],
+        ordered=False,
+    )
+
+
+def rebuild_pipeline(start_date: date, end_date: date, now: datetime):
+    """
+    Aggregation that recomputes rollups from attendance buckets and merges them in.
+
+    Records written before attendance carried `shift_name` fall back to the
+    user's current shift.
+    """
+    return [
+        {"$match": month_match(start_date, end_date)},
+        *flatten_punches(start_date, end_date),
+        {"$lookup": {
+            "from": user_collection_name,
+            "let": {"user_id": {"$toObjectId": "$user_id"}},
+            "pipeline": [
+                {"$match": {"$expr": {"$eq": ["$_id", "$$user_id"]}}},
+                {"$project": {"_id": 0, "manager_id": 1}},
+            ],
+            "as": "user",
+        }},
+        {"$lookup": {
+            "from": shift_collection_name,
+            "localField": "user_id",
+            "foreignField": "user_id",
+            "pipeline": [{"$project": {"_id": 0, "shift_name": 1}}],
+            "as": "shift",
+        }},
+        {"$group": {
+            "_id": {
+                "manager_id": {"$first": "$user.manager_id"},
+                "date": "$date",
+                "shift_name": {"$ifNull": ["$shift_name", {"$first": "$shift.shift_name"}]},
+            },
+            "present": {"$sum": 1},
+            "late": {"$sum": {"$cond": [{"$eq": ["$late", True]}, 1, 0]}},
+        }},
+        {"$match": {"_id.manager_id": {"$nin": [None, ""]}}},
+        {"$project": {
+            "_id": 0,
+            "manager_id": "$_id.manager_id",
+            "date": "$_id.date",
+            "shift_name": "$_id.shift_name",
+            "present": 1,
+            "late": 1,
+            "updated_at": now,
+        }},
+        {"$merge": {
+            "into": rollup_collection_name,
+            "on": ["manager_id", "date", "shift_name"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert",
+        }},
+    ]
+
+
+async def rebuild_rollups(start_date: date, end_date: date):
+    """
+    Recompute the rollups for a date range from raw attendance.
+
+    The recomputation runs entirely on the server via `$merge`, replacing each
+    rollup in place and stamping it with this run's start time, so readers
+    never see the range empty. Rollups the merge did not write and that no
+    live clock-in has touched since the run started have lost their source
+    records and are deleted afterwards.
+    """
+    # Whole seconds, so the stamp compares equal after BSON drops the microseconds
+    now = datetime.now().replace(microsecond=0)
+    date_range = {"$gte": start_date.isoformat(), "$lte": end_date.isoformat()}
+    await attendance_bucket_collection.aggregate(rebuild_pipeline(start_date, end_date, now)).to_list(None)
+    await rollup_collection.delete_many({"date": date_range, "updated_at": {"$not": {"$gte": now}}})
+    return await rollup_collection.count_documents({"date": date_range})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild attendance rollups from raw attendance.")
+    parser.add_argument("--start-date", type=date.fromisoformat, required=True)
+    parser.add_argument("--end-date", type=date.fromisoformat, required=True)
+    args = parser.parse_args()
+    rebuilt = asyncio.run(rebuild_rollups(args.start_date, args.end_date))
+    print(f"Rebuilt {rebuilt} rollups between {args.start_date} and {args.end_date}.")
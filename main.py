@@ -1,5 +1,34 @@
+import argparse
+import os
 import uvicorn
 
 
 if __name__ == "__main__":
-    uvicorn.run("app:app",host= "127.0.0.1", port=8943, reload=True)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the attendance management API.")
+    parser.add_argument(
+        "--prod", action="store_true",
+        help="Run without auto-reload on multiple worker processes.",
+    )
+    parser.add_argument("--host", default=os.getenv("HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 8943)))
+    parser.add_argument(
+        "--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        help="Worker processes in --prod mode (defaults to WEB_CONCURRENCY or the CPU count).",
+    )
+    parser.add_argument(
+        "--graceful-timeout", type=int, default=int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT", 30)),
+        help="Seconds to let in-flight requests finish on shutdown in --prod mode.",
+    )
+    args = parser.parse_args()
+
+    if args.prod:
+        uvicorn.run(
+            "app:app",
+            host=args.host,
+            port=args.port,
+            workers=args.workers,
+            proxy_headers=True,
+            timeout_graceful_shutdown=args.graceful_timeout,
+        )
+    else:
+        uvicorn.run("app:app", host=args.host, port=args.port, reload=True)
@@ -1,13 +1,19 @@
 from pydantic import BaseModel
 from datetime import datetime
 from typing import Optional
-import time
+from enum import Enum
 
-class Attendance(BaseModel):
-    user_id: str
-    date: str
-    time_in: str
+class AttendancePunch(BaseModel):
+    timestamp: datetime
     image: str
-    status: str
-    created_at: Optional[datetime] = None
-    updated_at: Optional[datetime] = None
\ No newline at end of file
+    user_id: Optional[str] = None
+
+class UploadUrlRequest(BaseModel):
+    content_type: str = "image/jpeg"
+
+class UploadConfirmation(BaseModel):
+    key: str
+
+class ReportFormat(str, Enum):
+    CSV = "csv"
+    NDJSON = "ndjson"
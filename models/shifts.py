@@ -1,5 +1,6 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
+from datetime import date
 from enum import Enum
 import time
 
@@ -13,6 +14,34 @@ class Shifts(BaseModel):
     shift_name: ShiftName
     start_time: str
     end_time: str
+    weekdays: Optional[List[int]] = None
+    rotation: Optional[List[Optional[ShiftName]]] = None
+    rotation_start: Optional[date] = None
     created_at: Optional[str] = int(time.time())
     updated_at: Optional[str] = int(time.time())
-    user_id: Optional[str] = None
\ No newline at end of file
+    user_id: Optional[str] = None
+
+class ShiftAssignment(BaseModel):
+    staff_id: str
+    shift_name: ShiftName
+    start_time: str
+    end_time: str
+    weekdays: Optional[List[int]] = None
+    rotation: Optional[List[Optional[ShiftName]]] = None
+    rotation_start: Optional[date] = None
+
+class ShiftDetails(BaseModel):
+    user_id: str
+    shift_name: str
+    start_time: str
+    end_time: str
+    weekdays: Optional[List[int]] = None
+    rotation: Optional[List[Optional[str]]] = None
+    rotation_start: Optional[str] = None
+    created_at: Optional[int] = None
+    updated_at: Optional[int] = None
+
+class ShiftRegistration(BaseModel):
+    msg: str
+    shift_id: Optional[str] = None
+    shift: Optional[ShiftDetails] = None
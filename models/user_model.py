@@ -23,3 +23,12 @@ class UserCreation(BaseModel):
 class UserLogin(BaseModel):
     email: EmailStr
     password: str
+
+class UserProfile(BaseModel):
+    username: str
+    full_name: str
+    email: str
+    role: Role
+    manager_id: Optional[str] = ""
+    created_at: Optional[int] = None
+    updated_at: Optional[int] = None
@@ -1,103 +1,653 @@
-from fastapi import APIRouter, HTTPException, status, Depends, File, UploadFile
-from datetime import datetime, timedelta
+from fastapi import APIRouter, HTTPException, status, Depends, File, UploadFile, Response, Request, Header
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.datastructures import UploadFile as StarletteUploadFile
+from datetime import date, datetime, timedelta
+import asyncio
+import json
 import time
-from Utils.OAuth import get_current_user
-from Utils.Config import s3_client,bucket_name
-from database.database_connection import shift_collection, attendance_collection
-from models.attendance import Attendance
+import orjson
+from Utils.OAuth import get_current_user, get_current_active_manager
+from Utils.Config import (
+    ATTENDANCE_BATCH_MAX_PUNCHES,
+    ATTENDANCE_BATCH_MAX_AGE,
+    CLOCK_OUT_MAX_HOURS,
+    LATE_GRACE_MINUTES,
+    IMAGE_MAX_UPLOAD_BYTES,
+    PRESIGNED_UPLOAD_EXPIRES,
+    ATTENDANCE_CONCURRENCY,
+    ATTENDANCE_QUEUE_SIZE,
+    ATTENDANCE_QUEUE_TIMEOUT,
+    ATTENDANCE_DB_CONCURRENCY,
+    ATTENDANCE_DB_QUEUE_SIZE,
+    ATTENDANCE_DB_QUEUE_TIMEOUT,
+    ADMISSION_RETRY_AFTER,
+    USER_RATE_LIMIT,
+    USER_RATE_BURST,
+    FEED_BUFFER_SIZE,
+    FEED_MAX_SUBSCRIBERS,
+    FEED_HEARTBEAT_SECONDS,
+    IMAGE_WORKERS,
+)
+from Utils.Admission import Gate, TokenBucket
+from Utils.Broker import Broker, DROPPED
+from Utils.Storage import head_object, object_exists, download_bytes, delete_object, presigned_put_url
+from Utils.ImagePipeline import accept_image, stage_image, store_image, store_image_data
+from Utils.ShiftCalendar import CompiledSchedule, ShiftWindow, shift_calendar
+from database.database_connection import attendance_bucket_collection, user_collection
+from database.attendance_buckets import (
+    IMAGE_PENDING, IMAGE_STORED, IMAGE_FAILED,
+    punch_entry, punch_upsert, record_punch, retry_punch, punch_exists, latest_punch, record_clock_out, set_image_state,
+)
+from database.rollups import record_attendance, record_attendance_many
+from database import idempotency, outbox
+from models.attendance import AttendancePunch, UploadUrlRequest, UploadConfirmation
 from botocore.exceptions import NoCredentialsError
-from typing import Dict
-import os
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from typing import Dict, Optional
+from uuid import uuid4
+import logging
 
 router = APIRouter()
+logger = logging.getLogger("attendance")
+
+# Admission control for the shift-start surge. `attendance_gate` is applied to
+# whole clock-in requests by the AdmissionMiddleware in app.py, before the photo
+# is read; `db_gate` bounds concurrent attendance writes. Both queue briefly and
+# then answer 429 with a jittered Retry-After. `user_rate` is an optional
+# per-user token bucket (USER_RATE_LIMIT requests per second, 0 disables it).
+attendance_gate = Gate(
+    "attendance", ATTENDANCE_CONCURRENCY, ATTENDANCE_QUEUE_SIZE,
+    ATTENDANCE_QUEUE_TIMEOUT, ADMISSION_RETRY_AFTER,
+)
+db_gate = Gate(
+    "attendance-db", ATTENDANCE_DB_CONCURRENCY, ATTENDANCE_DB_QUEUE_SIZE,
+    ATTENDANCE_DB_QUEUE_TIMEOUT, ADMISSION_RETRY_AFTER,
+)
+user_rate = TokenBucket("attendance-user", USER_RATE_LIMIT, USER_RATE_BURST)
+
+# Batch images are read into memory only once they hold one of these slots, so
+# all batches together keep at most IMAGE_WORKERS photos in memory.
+batch_image_slots = asyncio.Semaphore(IMAGE_WORKERS)
+
+# Live clock-ins and clock-outs for manager dashboards, one topic per manager ID.
+attendance_feed = Broker("attendance-feed", FEED_BUFFER_SIZE, FEED_MAX_SUBSCRIBERS, ADMISSION_RETRY_AFTER)
+
+
+def charge_rate_limit(current_user: dict):
+    """
+    Take one token from the user's rate limit bucket, or raise a 429.
+    """
+    if user_rate.rate > 0:
+        user_rate.check(str(current_user.get("_id")))
+
+
+async def rate_limited_user(current_user: Dict = Depends(get_current_user)):
+    """
+    `get_current_user`, charged one token from the user's rate limit bucket.
+    """
+    charge_rate_limit(current_user)
+    return current_user
+
+
+def check_shift_window(schedule: CompiledSchedule, punch_time: datetime) -> ShiftWindow:
+    """
+    Ensure a punch falls within 1 hour of one of the user's scheduled shifts.
+
+    Raises a 403 error when the punch is outside every shift window; otherwise
+    returns the window, whose `work_date` is the day the shift started (the
+    previous day for a punch after midnight on an overnight shift).
+    """
+    window = schedule.window_at(punch_time)
+    if window is None:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Attendance can only be marked within 1 hour of your shift timings."
+        )
+    return window
+
+
+def is_late(punch_time: datetime, shift_start: datetime) -> bool:
+    return punch_time > shift_start + timedelta(minutes=LATE_GRACE_MINUTES)
+
+
+def sse_message(event: str, data: dict) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+
+def publish_clock_in(manager_id: Optional[str], user_id: str, entry: dict):
+    """
+    Send a recorded punch to the feed of the user's manager, if anyone is listening.
+    """
+    if manager_id:
+        attendance_feed.publish(manager_id, sse_message("clock_in", {
+            "attendance_id": str(entry["id"]),
+            "user_id": user_id,
+            "date": entry["d"].strftime("%Y-%m-%d"),
+            "time_in": entry["t"].strftime("%H:%M:%S"),
+            "shift_name": entry["shift"],
+            "late": entry["late"],
+            "image_state": entry.get("img_state", IMAGE_STORED),
+        }))
+
+
+def storage_error(e: Exception) -> HTTPException:
+    """
+    The 500 error reported when storing an attendance image fails.
+    """
+    if isinstance(e, NoCredentialsError):
+        return HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Credentials for S3 are not configured properly."
+        )
+    return HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail=f"An error occurred while uploading the image: {str(e)}"
+    )
+
+
+async def upload_attendance_image(image: UploadFile):
+    """
+    Preprocess an attendance image and store it in S3 under its content hash.
+
+    Returns the summary from `store_image`: object key, original and stored
+    sizes, whether an existing object was reused and per-stage timings. Storage
+    failures are turned into 500 errors.
+    """
+    try:
+        stored = await store_image(image, extra_args={'ACL': 'public-read'})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise storage_error(e)
+    return stored
+
+
+async def stage_attendance_image(data: bytes) -> dict:
+    """
+    Upload a checked photo to the staging prefix for the background task.
+    Storage failures are turned into 500 errors.
+    """
+    try:
+        return await stage_image(data)
+    except Exception as e:
+        raise storage_error(e)
+
+
+async def discard_staged_image(staging_key: str):
+    """
+    Best-effort removal of a staged photo whose punch was not saved; the
+    bucket's lifecycle rule catches any this misses.
+    """
+    try:
+        await delete_object(staging_key)
+    except Exception:
+        logger.warning("Could not delete a staged attendance image", extra={"key": staging_key}, exc_info=True)
+
+
+async def get_user_schedule(user_id: str) -> CompiledSchedule:
+    """
+    Fetch a user's compiled shift schedule, raising a 404 error when none is assigned.
+    """
+    schedule = await shift_calendar.schedule_for(user_id)
+    if schedule is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Shift not found.")
+    return schedule
+
+
+async def store_queued_image(payload: dict):
+    """
+    Background task: process and upload a photo staged by `mark_attendance`,
+    mark its punch's image as stored, then delete the staged copy.
+
+    Safe to run again, and to requeue once dead-lettered while the staged
+    copy is kept: a run after the copy is deleted finds the stored object and
+    only sets the state.
+    """
+    data = await download_bytes(payload["staging_key"])
+    if data is None:
+        if not await object_exists(payload["key"]):
+            raise outbox.DeadLetter("The staged image no longer exists.")
+    else:
+        try:
+            await store_image_data(data, payload["key"], extra_args={'ACL': 'public-read'})
+        except ValueError as e:
+            raise outbox.DeadLetter(str(e))
+    if not await set_image_state(payload["user_id"], payload["day"], payload["punch_id"], IMAGE_STORED):
+        # The request failed after enqueueing and its punch was never saved.
+        logger.warning("Stored an image for a missing attendance record", extra={"key": payload["key"]})
+    if data is not None:
+        await delete_object(payload["staging_key"])
+
+
+async def mark_image_failed(payload: dict):
+    await set_image_state(payload["user_id"], payload["day"], payload["punch_id"], IMAGE_FAILED)
+
+
+STORE_IMAGE_TASK = "attendance.store_image"
+outbox.register(STORE_IMAGE_TASK, store_queued_image, on_dead=mark_image_failed)
+
+
+async def save_attendance(current_user: dict, window: ShiftWindow, punch_time: datetime, image_key: str,
+                          staging_key: str = None) -> str:
+    """
+    Store the attendance punch for a validated clock-in and count it in the rollups.
+
+    The punch is filed under its shift's date; a second clock-in for the same
+    shift, including a concurrent one, is rejected with a 409 error. Returns
+    the new attendance ID.
+
+    With `staging_key` the photo has only been staged: the punch is saved
+    with a pending image and a background task, enqueued before the punch is
+    written, processes and uploads it. The caller deletes the staged copy if
+    this raises.
+    """
+    user_id = str(current_user.get("_id"))
+    entry = punch_entry(
+        punch_time, image_key, window.shift_name, is_late(punch_time, window.start), window.work_date,
+        image_state=IMAGE_STORED if staging_key is None else IMAGE_PENDING,
+    )
+    async with db_gate.slot():
+        task_id = None
+        if staging_key is not None:
+            task_id = await outbox.enqueue(STORE_IMAGE_TASK, {
+                "user_id": user_id, "day": entry["d"], "punch_id": entry["id"],
+                "key": image_key, "staging_key": staging_key,
+            })
+        try:
+            attendance_id = await record_punch(user_id, entry)
+        except BaseException as e:
+            # Nothing will dispatch the task, so drop it whatever went wrong
+            if task_id is not None:
+                await asyncio.shield(outbox.discard(task_id))
+            if isinstance(e, DuplicateKeyError):
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="Attendance for this shift has already been marked."
+                )
+            raise
+        if task_id is not None:
+            outbox.dispatch(task_id)
+        await record_attendance(
+            current_user.get("manager_id"), window.work_date.isoformat(), entry["shift"], entry["late"]
+        )
+    publish_clock_in(current_user.get("manager_id"), user_id, entry)
+    return attendance_id
+
+
+def image_timing_headers(timings: dict, db_seconds: float) -> dict:
+    """
+    Response headers reporting per-stage latency for one image.
+    """
+    timings = {**timings, "db-write": db_seconds}
+    return {
+        "Server-Timing": ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items()),
+    }
+
 
 @router.post("/", response_description="Mark attendance with image")
 async def mark_attendance(
+    response: Response,
     image: UploadFile = File(...),
-    current_user: Dict = Depends(get_current_user)
+    current_user: Dict = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
 ):
     """
     This API marks the attendance of the current user and stores an image in S3.
+
+    The request only reads and checks the image and stages the raw bytes in
+    S3; downscaling, re-encoding and the final upload run in a background task
+    after the punch is saved, so the response reports `image_state` "pending". Identical images reuse the
+    stored object. Per-stage latency is reported in the `Server-Timing`
+    response header.
+
+    Clients should send an `Idempotency-Key` header and reuse it when retrying.
+    A retry then gets the original response back without another shift lookup
+    or upload, and a retry that races the original waits for its result.
+    Replays are not charged to the user's rate limit; only requests that run are.
     """
-    user_id = str(current_user.get("_id"))
+    async def mark():
+        charge_rate_limit(current_user)
 
-    # Find the shift for the current user
-    shift = shift_collection.find_one({"user_id": user_id})
+        # Find the shift window the punch falls in
+        schedule = await get_user_schedule(str(current_user.get("_id")))
 
-    if not shift:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Shift not found.")
+        now = datetime.now()
+        window = check_shift_window(schedule, now)
 
-    shift_start_time_str = shift["start_time"]
-    shift_end_time_str = shift["end_time"]
+        # Check and stage the image; it is processed and saved in the background
+        accepted = await accept_image(image)
+        staged = await stage_attendance_image(accepted["data"])
+        accepted["timings"]["image-stage"] = staged["seconds"]
 
-    # Convert shift start and end times to datetime objects for today
-    now = datetime.now()
-    shift_start_time = datetime.strptime(shift_start_time_str, "%H:%M").time()
-    shift_end_time = datetime.strptime(shift_end_time_str, "%H:%M").time()
-    
-    shift_start = datetime.combine(now.date(), shift_start_time)
-    shift_end = datetime.combine(now.date(), shift_end_time)
-
-    # Adjust for next day if shift end is before start time (i.e., overnight shift)
-    if shift_end < shift_start:
-        shift_end += timedelta(days=1)
-
-    # Check if the current time is within 1 hour of shift timings
-    current_time = datetime.now()
-    if not (shift_start - timedelta(hours=1) <= current_time <= shift_end + timedelta(hours=1)):
+        db_started = time.perf_counter()
+        try:
+            attendance_id = await save_attendance(
+                current_user, window, now, accepted["key"], staging_key=staged["key"]
+            )
+        except BaseException:
+            await asyncio.shield(discard_staged_image(staged["key"]))
+            raise
+        db_seconds = time.perf_counter() - db_started
+
+        body = {"msg": "Attendance marked successfully", "attendance_id": attendance_id, "image_state": IMAGE_PENDING}
+        return body, image_timing_headers(accepted["timings"], db_seconds)
+
+    if idempotency_key is not None:
+        return await idempotency.run(str(current_user.get("_id")), idempotency_key, "attendance.mark", mark)
+    body, headers = await mark()
+    response.headers.update(headers)
+    return body
+
+def upload_key_prefix(user_id: str, work_date: date) -> str:
+    return f"attendance_uploads/{user_id}/{work_date.isoformat()}/"
+
+
+@router.post("/upload-url", response_description="Presigned URL for a direct image upload")
+async def create_upload_url(
+    payload: UploadUrlRequest,
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    Issue a presigned PUT URL for uploading an attendance photo straight to S3.
+
+    The same shift window and duplicate checks as `mark_attendance` run first,
+    so a client never uploads a photo that cannot be recorded. The object key is
+    scoped to the user and the shift's date; confirm the upload with `/confirm`.
+    """
+    user_id = str(current_user.get("_id"))
+    if not payload.content_type.startswith("image/"):
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Attendance can only be marked within 1 hour of your shift timings."
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Only image uploads are allowed."
         )
 
-    # Check if attendance has already been marked for the current shift period
-    existing_attendance = attendance_collection.find_one({
-        "user_id": user_id,
-        "date": now.strftime("%Y-%m-%d"),
-        "status": "Present"
-    })
-
-    if existing_attendance:
+    schedule = await get_user_schedule(user_id)
+    now = datetime.now()
+    window = check_shift_window(schedule, now)
+    if await punch_exists(user_id, window.work_date):
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="Attendance for this shift has already been marked."
         )
 
-    # Save the image file to S3
-    try:
-        file_key = f"attendance_images/{int(time.time())}_{image.filename}"
-        s3_client.upload_fileobj(image.file, bucket_name, file_key,    ExtraArgs={'ACL': 'public-read'}
-)
-        file_url = f"https://{bucket_name}.s3.{os.getenv('AWS_REGION')}.amazonaws.com/{file_key}"
-    except NoCredentialsError:
+    key = f"{upload_key_prefix(user_id, window.work_date)}{uuid4().hex}"
+    return {
+        "upload_url": presigned_put_url(key, payload.content_type, PRESIGNED_UPLOAD_EXPIRES, acl="public-read"),
+        "key": key,
+        "expires_in": PRESIGNED_UPLOAD_EXPIRES,
+        "headers": {"Content-Type": payload.content_type, "x-amz-acl": "public-read"},
+    }
+
+
+@router.post("/confirm", response_description="Record attendance for a direct upload")
+async def confirm_upload(
+    payload: UploadConfirmation,
+    current_user: Dict = Depends(rate_limited_user)
+):
+    """
+    Record attendance for a photo uploaded through a presigned URL.
+
+    The shift window is re-checked at confirmation time, the key must belong to
+    the current user and that shift's date (so an overnight shift can confirm
+    after midnight), and a HEAD request must find the object with an image
+    content type and an acceptable size. A second punch for the same shift is
+    rejected, exactly as in `mark_attendance`.
+    """
+    user_id = str(current_user.get("_id"))
+    now = datetime.now()
+    schedule = await get_user_schedule(user_id)
+    window = check_shift_window(schedule, now)
+    if not payload.key.startswith(upload_key_prefix(user_id, window.work_date)):
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Credentials for S3 are not configured properly."
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="This upload does not belong to you or has expired."
         )
-    except Exception as e:
+
+    metadata = await head_object(payload.key)
+    if metadata is None:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"An error occurred while uploading the image: {str(e)}"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="The image has not been uploaded yet."
+        )
+    if not metadata.get("ContentType", "").startswith("image/") or metadata.get("ContentLength", 0) > IMAGE_MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"The upload must be an image of at most {IMAGE_MAX_UPLOAD_BYTES} bytes."
         )
 
-    # Create attendance record
-    attendance_record = Attendance(
-        user_id=user_id,
-        date=now.strftime("%Y-%m-%d"),
-        time_in=now.strftime("%H:%M:%S"),
-        image=file_url,
-        status="Present",
-        created_at=datetime.now(),
-        update_at=datetime.now()
+    attendance_id = await save_attendance(current_user, window, now, payload.key)
+    return {"msg": "Attendance marked successfully", "attendance_id": attendance_id}
+
+
+@router.post("/clock-out", response_description="Record the end of the current shift")
+async def clock_out(current_user: Dict = Depends(rate_limited_user)):
+    """
+    Record when the current user leaves work.
+
+    The clock-out is added to the user's latest clock-in from the last
+    `CLOCK_OUT_MAX_HOURS` hours and can be recorded only once per shift. Payroll
+    compares it with the shift end for early departures and overtime.
+    """
+    user_id = str(current_user.get("_id"))
+    now = datetime.now()
+    async with db_gate.slot():
+        punch = await latest_punch(user_id, now, timedelta(hours=CLOCK_OUT_MAX_HOURS))
+        if punch is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="No clock-in found for your current shift."
+            )
+        if "o" in punch or not await record_clock_out(user_id, punch, now):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="You have already clocked out of this shift."
+            )
+    if current_user.get("manager_id"):
+        attendance_feed.publish(current_user["manager_id"], sse_message("clock_out", {
+            "attendance_id": str(punch["id"]),
+            "user_id": user_id,
+            "date": punch["d"].strftime("%Y-%m-%d"),
+            "time_out": now.strftime("%H:%M:%S"),
+        }))
+    return {"msg": "Clock-out recorded successfully", "attendance_id": str(punch["id"])}
+
+
+@router.get("/feed", response_description="Live attendance events for the manager's staff")
+async def attendance_feed_stream(manager: Dict = Depends(get_current_active_manager)):
+    """
+    Stream clock-ins and clock-outs of the manager's staff as Server-Sent Events.
+
+    Events are `clock_in` (`attendance_id`, `user_id`, `date`, `time_in`,
+    `shift_name`, `late`, `image_state`) and `clock_out` (`attendance_id`,
+    `user_id`, `date`, `time_out`), as JSON, sent as this worker records
+    them; a comment line is sent every
+    `FEED_HEARTBEAT_SECONDS` to keep idle connections open. Only punches
+    handled by the same worker process are seen, so dashboards should still
+    refresh from the reports on connect. A client that falls more than
+    `FEED_BUFFER_SIZE` events behind gets a `dropped` event and the stream
+    ends; it should refresh and reconnect.
+    """
+    subscription = attendance_feed.subscribe(str(manager["_id"]))
+
+    async def events():
+        try:
+            yield b"retry: 5000\n\n"
+            while True:
+                message = await subscription.get(FEED_HEARTBEAT_SECONDS)
+                if message is None:
+                    yield b": keep-alive\n\n"
+                elif message is DROPPED:
+                    yield sse_message("dropped", {"detail": "Too many pending events. Refresh and reconnect."})
+                    return
+                else:
+                    yield message
+        finally:
+            attendance_feed.unsubscribe(subscription)
+
+    # The background task also unsubscribes when the client leaves before the stream starts.
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(attendance_feed.unsubscribe, subscription),
     )
 
-    # Insert attendance record into the database
-    attendance_response = attendance_collection.insert_one(attendance_record.dict())
 
-    if attendance_response.inserted_id:
-        return {"msg": "Attendance marked successfully", "attendance_id": str(attendance_response.inserted_id)}
-    else:
+@router.post("/batch", response_description="Replay a batch of attendance punches")
+async def mark_attendance_batch(
+    request: Request,
+    current_user: Dict = Depends(get_current_user)
+):
+    """
+    Record a batch of attendance punches, e.g. replayed by an offline kiosk.
+
+    The multipart body carries a `punches` field with one JSON punch per line
+    (`{"timestamp": ..., "image": <file field>, "user_id": ...}`) plus one file
+    part per punch. Staff may only submit their own punches; managers may submit
+    punches for themselves and the staff they manage. Punches older than
+    `ATTENDANCE_BATCH_MAX_AGE` seconds are rejected, so a batch cannot backfill
+    missed shifts; every other punch is checked against the user's shift
+    window with the same rules as `mark_attendance`.
+    Images are read, processed and uploaded `IMAGE_WORKERS` at a time and all
+    valid punches are written with one unordered bulk write. The response holds a result per punch, in order.
+    """
+    current_user_id = str(current_user.get("_id"))
+    form = await request.form(
+        max_files=ATTENDANCE_BATCH_MAX_PUNCHES, max_fields=ATTENDANCE_BATCH_MAX_PUNCHES + 1
+    )
+    lines = [line for line in str(form.get("punches") or "").splitlines() if line.strip()]
+    if not lines:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Failed to mark attendance. Please try again."
-        )
\ No newline at end of file
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="No punches provided."
+        )
+    if len(lines) > ATTENDANCE_BATCH_MAX_PUNCHES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"A batch can contain at most {ATTENDANCE_BATCH_MAX_PUNCHES} punches."
+        )
+
+    results = [None] * len(lines)
+    punches = {}
+
+    def reject(index, status_code, detail):
+        results[index] = {"index": index, "status_code": status_code, "detail": detail}
+        punches.pop(index, None)
+
+    now = datetime.now()
+    for index, line in enumerate(lines):
+        try:
+            fields = json.loads(line)
+            if not isinstance(fields, dict):
+                raise ValueError("each line must be a JSON object")
+            punch = AttendancePunch(**fields)
+        except ValueError as e:
+            reject(index, status.HTTP_422_UNPROCESSABLE_ENTITY, f"Invalid punch: {e}")
+            continue
+        if punch.timestamp.tzinfo is not None:
+            punch.timestamp = punch.timestamp.astimezone().replace(tzinfo=None)
+        punch.user_id = punch.user_id or current_user_id
+        if punch.timestamp > now + timedelta(minutes=5):
+            reject(index, status.HTTP_422_UNPROCESSABLE_ENTITY, "Punch timestamp is in the future.")
+        elif punch.timestamp < now - timedelta(seconds=ATTENDANCE_BATCH_MAX_AGE):
+            reject(index, status.HTTP_422_UNPROCESSABLE_ENTITY, "Punch is too old to be replayed.")
+        elif not isinstance(form.get(punch.image), StarletteUploadFile):
+            reject(index, status.HTTP_422_UNPROCESSABLE_ENTITY, "Image file not found in the request.")
+        elif punch.user_id != current_user_id and current_user.get("role") != "manager":
+            reject(index, status.HTTP_403_FORBIDDEN, "You can only mark your own attendance.")
+        elif not ObjectId.is_valid(punch.user_id):
+            reject(index, status.HTTP_422_UNPROCESSABLE_ENTITY, "Invalid user ID.")
+        else:
+            punches[index] = punch
+
+    # Verify ownership of every other user in one query, then load all uncached schedules in one more
+    other_user_ids = {punch.user_id for punch in punches.values()} - {current_user_id}
+    allowed_user_ids = {current_user_id}
+    if other_user_ids:
+        managed = user_collection.find(
+            {"_id": {"$in": [ObjectId(user_id) for user_id in other_user_ids]}, "manager_id": current_user_id},
+            {"_id": 1},
+        )
+        allowed_user_ids.update([str(user["_id"]) async for user in managed])
+    schedules = await shift_calendar.schedules_for({punch.user_id for punch in punches.values()})
+
+    windows = {}
+    for index, punch in list(punches.items()):
+        if punch.user_id not in allowed_user_ids:
+            reject(index, status.HTTP_403_FORBIDDEN, "You are not authorized to mark this user's attendance.")
+        elif punch.user_id not in schedules:
+            reject(index, status.HTTP_404_NOT_FOUND, "Shift not found.")
+        else:
+            try:
+                windows[index] = check_shift_window(schedules[punch.user_id], punch.timestamp)
+            except HTTPException as e:
+                reject(index, e.status_code, e.detail)
+
+    # Process and upload the remaining images, as many at a time as there are image workers;
+    # the uploaded files stay spooled by the form parser until a slot is free
+    async def upload(index, punch):
+        try:
+            async with batch_image_slots:
+                stored = await upload_attendance_image(form[punch.image])
+        except HTTPException as e:
+            reject(index, e.status_code, e.detail)
+            return
+        return index, stored["key"]
+
+    uploaded = [item for item in await asyncio.gather(*(upload(i, p) for i, p in punches.items())) if item]
+    if not uploaded:
+        return {"accepted": 0, "rejected": len(results), "results": results}
+
+    entries = []
+    for index, file_key in uploaded:
+        punch, window = punches[index], windows[index]
+        entries.append(punch_entry(
+            punch.timestamp, file_key, window.shift_name,
+            is_late(punch.timestamp, window.start), window.work_date,
+        ))
+
+    # One unordered bulk write of bucket upserts; duplicates (already marked, or
+    # repeated within the batch) fail individually without stopping the others
+    failed = {}
+    try:
+        await attendance_bucket_collection.bulk_write(
+            [
+                UpdateOne(*punch_upsert(punches[index].user_id, entry), upsert=True)
+                for (index, _), entry in zip(uploaded, entries)
+            ],
+            ordered=False,
+        )
+    except BulkWriteError as e:
+        failed = {error["index"]: error for error in e.details.get("writeErrors", [])}
+
+    # A duplicate key may also mean another punch created the month's bucket
+    # first; those punches are retried into the existing bucket
+    for position, error in list(failed.items()):
+        if error.get("code") == 11000 and await retry_punch(punches[uploaded[position][0]].user_id, entries[position]):
+            del failed[position]
+
+    rollups = []
+    for position, (index, _) in enumerate(uploaded):
+        error = failed.get(position)
+        if error is None:
+            entry = entries[position]
+            user_id = punches[index].user_id
+            manager_id = current_user.get("manager_id") if user_id == current_user_id else current_user_id
+            rollups.append((manager_id, entry["d"].strftime("%Y-%m-%d"), entry["shift"], entry["late"]))
+            publish_clock_in(manager_id, user_id, entry)
+            results[index] = {
+                "index": index,
+                "status_code": status.HTTP_201_CREATED,
+                "attendance_id": str(entry["id"]),
+            }
+        elif error.get("code") == 11000:
+            reject(index, status.HTTP_409_CONFLICT, "Attendance for this shift has already been marked.")
+        else:
+            reject(index, status.HTTP_400_BAD_REQUEST, "Failed to mark attendance. Please try again.")
+    await record_attendance_many(rollups)
+
+    accepted = sum(1 for result in results if result["status_code"] == status.HTTP_201_CREATED)
+    return {"accepted": accepted, "rejected": len(results) - accepted, "results": results}
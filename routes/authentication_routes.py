@@ -1,5 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from models.user_model import UserCreation, UserLogin
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from starlette.datastructures import UploadFile
+from models.user_model import UserCreation, UserLogin, UserProfile
 from Utils.OAuth import (
     get_current_user,
     authenticate_user_,
@@ -8,9 +9,15 @@ from Utils.OAuth import (
     get_password_hash,
     check_password_match,
 )
+from Utils.HttpCache import cache_headers, make_etag, not_modified
+from Utils.PasswordHasher import hash_passwords
 from database.database_connection import user_collection
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from pydantic import ValidationError
+import csv
+import io
 import time
-from Utils.Config import MANAGER_SECRET_KEY
+from Utils.Config import MANAGER_SECRET_KEY, BULK_REGISTER_MAX_ROWS
 
 routes = APIRouter()
 
@@ -23,14 +30,11 @@ async def create_user(
     Register a new staff user.
 
     This endpoint allows a manager to register a new staff member. The manager
-    must be authenticated and the new user must not already exist. The endpoint
+    must be authenticated and the new user must not already exist (enforced by the
+    unique email index). The endpoint
     will hash the password and ensure it matches the confirmation field before
     saving the user data.
     """
-    if user_collection.find_one({"email": userPayload.email}):
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT, detail="User already exists."
-        )
     if userPayload.role == "manager":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail="You cannot create a manager."
@@ -39,13 +43,18 @@ async def create_user(
     # Check password match
     check_password_match(userPayload.confirm_password, userPayload.password)
     user_data = userPayload.dict(exclude={"confirm_password"})
-    user_data["password"] = get_password_hash(userPayload["password"])
+    user_data["password"] = await get_password_hash(userPayload.password)
     user_data["manager_id"] = str(manager.get("_id"))
     user_data["created_at"] = int(time.time())
     user_data["updated_at"] = int(time.time())
 
-    # Insert user into collection
-    result = await user_collection.insert_one(user_data)
+    # Insert user into collection; the unique email index rejects existing users
+    try:
+        result = await user_collection.insert_one(user_data)
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="User already exists."
+        )
     if result.inserted_id:
         return {
             "message": "User registered successfully",
@@ -57,6 +66,118 @@ async def create_user(
     )
 
 
+async def read_bulk_rows(request: Request) -> list:
+    """
+    Read staff rows from a JSON array body or a multipart CSV upload.
+
+    The CSV file is expected in a `file` field with a header row naming the
+    `UserCreation` fields.
+    """
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if not isinstance(upload, UploadFile):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="CSV file is required."
+            )
+        text = (await upload.read()).decode("utf-8-sig")
+        return list(csv.DictReader(io.StringIO(text)))
+
+    try:
+        rows = await request.json()
+    except ValueError:
+        rows = None
+    if not isinstance(rows, list):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Expected a JSON array of users."
+        )
+    return rows
+
+
+@routes.post("/register-staff/bulk", response_description="Register staff users in bulk")
+async def create_users_bulk(request: Request, manager: dict = Depends(get_current_active_manager)):
+    """
+    Register many staff users in one request.
+
+    Accepts a JSON array or a CSV upload of staff rows. Every row is validated
+    like `/register-staff`; existing emails are found with a single `$in` query,
+    passwords are hashed in parallel on the bulk process pool and the users are
+    written with one unordered `insert_many`. Returns a result per row, in order.
+    """
+    rows = await read_bulk_rows(request)
+    if len(rows) > BULK_REGISTER_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {BULK_REGISTER_MAX_ROWS} users can be registered at once.",
+        )
+
+    results = [None] * len(rows)
+    users = {}
+    for index, row in enumerate(rows):
+        try:
+            if not isinstance(row, dict):
+                raise ValueError("Row must be an object.")
+            userPayload = UserCreation(**{"role": "staff", **row})
+        except ValidationError as e:
+            detail = "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+            results[index] = {"row": index, "status_code": status.HTTP_422_UNPROCESSABLE_ENTITY, "detail": detail}
+            continue
+        except ValueError as e:
+            results[index] = {"row": index, "status_code": status.HTTP_422_UNPROCESSABLE_ENTITY, "detail": str(e)}
+            continue
+        if userPayload.role == "manager":
+            results[index] = {"row": index, "status_code": status.HTTP_403_FORBIDDEN, "detail": "You cannot create a manager."}
+        elif userPayload.password != userPayload.confirm_password:
+            results[index] = {"row": index, "status_code": status.HTTP_400_BAD_REQUEST, "detail": "Password doesn't match."}
+        else:
+            users[index] = userPayload
+
+    # One round-trip for every email in the upload, plus duplicates within it
+    emails = [userPayload.email for userPayload in users.values()]
+    existing = {
+        user["email"]
+        async for user in user_collection.find({"email": {"$in": emails}}, {"_id": 0, "email": 1})
+    }
+    seen = set()
+    for index, userPayload in list(users.items()):
+        if userPayload.email in existing or userPayload.email in seen:
+            results[index] = {"row": index, "status_code": status.HTTP_409_CONFLICT, "detail": "User already exists."}
+            del users[index]
+        seen.add(userPayload.email)
+
+    indexes = list(users)
+    hashes = await hash_passwords([users[index].password for index in indexes])
+    now = int(time.time())
+    documents = []
+    for index, hashed in zip(indexes, hashes):
+        user_data = users[index].dict(exclude={"confirm_password"})
+        user_data["password"] = hashed
+        user_data["manager_id"] = str(manager.get("_id"))
+        user_data["created_at"] = now
+        user_data["updated_at"] = now
+        documents.append(user_data)
+
+    # Emails registered concurrently by another request still hit the unique index
+    failed = {}
+    if documents:
+        try:
+            await user_collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            failed = {error["index"]: error for error in e.details.get("writeErrors", [])}
+
+    for position, (index, user_data) in enumerate(zip(indexes, documents)):
+        error = failed.get(position)
+        if error is None:
+                    results[index] = {"row": index, "status_code": status.HTTP_201_CREATED, "user_id": str(user_data["_id"])}
+        elif error.get("code") == 11000:
+            results[index] = {"row": index, "status_code": status.HTTP_409_CONFLICT, "detail": "User already exists."}
+        else:
+            results[index] = {"row": index, "status_code": status.HTTP_400_BAD_REQUEST, "detail": "Please try again."}
+
+    created = sum(1 for result in results if result["status_code"] == status.HTTP_201_CREATED)
+    return {"created": created, "rejected": len(results) - created, "results": results}
+
+
 @routes.post("/login", response_description="Login to check details")
 async def login_manager(userLoginPayload: UserLogin):
     """
@@ -98,12 +219,6 @@ async def create_user(userPayload: UserCreation):
     the password and ensure it matches the confirmation field before saving the
     user data.
     """
-    # Check if user already exists
-    if user_collection.find_one({"email": userPayload.email}):
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT, detail="User already exists."
-        )
-
     # Validate role and secret key
     if userPayload.role != "manager":
         raise HTTPException(
@@ -119,12 +234,17 @@ async def create_user(userPayload: UserCreation):
     # Check password match
     # Prepare user payload
     user_data = userPayload.dict(exclude={"confirm_password"})
-    user_data["password"] = get_password_hash(userPayload.password)
+    user_data["password"] = await get_password_hash(userPayload.password)
     user_data["created_at"] = int(time.time())
     user_data["updated_at"] = int(time.time())
 
-    # Insert user into collection
-    result = await user_collection.insert_one(user_data)
+    # Insert user into collection; the unique email index rejects existing users
+    try:
+        result = await user_collection.insert_one(user_data)
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="User already exists."
+        )
     if result.inserted_id:
         return {"message": "Manager registered successfully"}
 
@@ -134,19 +254,31 @@ async def create_user(userPayload: UserCreation):
     )
 
 
-@routes.get("/user", response_description="Get current user detail")
-async def get_current_user_info(current_user: dict = Depends(get_current_user)):
+@routes.get("/user", response_description="Get current user detail", response_model=UserProfile)
+async def get_current_user_info(
+    request: Request, response: Response, current_user: dict = Depends(get_current_user)
+):
     """
     Retrieve the details of the currently authenticated user.
 
-    This endpoint returns the information of the currently logged-in user, excluding
-    sensitive fields such as the user ID.
+    This endpoint returns the profile of the currently logged-in user. The user ID,
+    password hash and manager secret are never part of the response.
+
+    The ETag and Last-Modified come from the user's ID and `updated_at`, which
+    `get_current_user` has already loaded, so a matching If-None-Match (or
+    If-Modified-Since) is answered with an empty 304 without a database read.
     """
     if "_id" not in current_user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User details not found."
         )
 
+    etag = make_etag("user", current_user["_id"], current_user.get("updated_at"))
+    cached = not_modified(request, etag, current_user.get("updated_at"))
+    if cached is not None:
+        return cached
+    response.headers.update(cache_headers(etag, current_user.get("updated_at")))
+
     # Remove the user ID from the response data
     user_info = {key: value for key, value in current_user.items() if key != "_id"}
 
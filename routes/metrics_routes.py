@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+routes = APIRouter()
+
+
+@routes.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Expose this worker's metrics in the Prometheus text format.
+    """
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
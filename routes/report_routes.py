@@ -0,0 +1,179 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from datetime import date
+from typing import Dict, Optional
+import csv
+import io
+import json
+from bson import ObjectId
+from Utils.OAuth import get_current_active_manager
+from Utils.Config import attendance_bucket_collection_name, REPORT_CURSOR_BATCH_SIZE, REPORT_STREAM_CHUNK_SIZE
+from database.attendance_buckets import PRESENT, month_match, flatten_punches
+from database.database_connection import user_collection, rollup_collection
+from models.attendance import ReportFormat
+
+routes = APIRouter()
+
+REPORT_FIELDS = ["user_id", "username", "full_name", "email", "date", "time_in", "status", "image", "image_state"]
+
+
+def attendance_report_pipeline(manager_id: str, start_date: date, end_date: date,
+                               staff_id: Optional[str] = None):
+    """
+    Build the aggregation that joins a manager's staff to their attendance.
+
+    The pipeline starts from `users` (indexed on manager_id) and looks up each
+    staff member's monthly attendance buckets through the (user_id, month)
+    index, so only the manager's own buckets for the months in the range are
+    read. It emits one flat document per attendance record, in user then date
+    order. Records are dated by the shift they belong to, as resolved by the
+    shift calendar when the punch was taken, so a punch after midnight on an
+    overnight shift is reported on the day the shift started.
+    """
+    user_match = {"manager_id": manager_id, "role": "staff"}
+    if staff_id:
+        user_match["_id"] = ObjectId(staff_id)
+
+    return [
+        {"$match": user_match},
+        {"$sort": {"_id": 1}},
+        {"$project": {"user_id": {"$toString": "$_id"}, "username": 1, "full_name": 1, "email": 1}},
+        {"$lookup": {
+            "from": attendance_bucket_collection_name,
+            "localField": "user_id",
+            "foreignField": "user_id",
+            "pipeline": [
+                {"$match": month_match(start_date, end_date)},
+                *flatten_punches(start_date, end_date),
+                {"$sort": {"t": 1}},
+                {"$project": {"_id": 0, "date": 1, "time_in": 1, "status": 1, "image": 1, "image_state": 1}},
+            ],
+            "as": "attendance",
+        }},
+        {"$unwind": "$attendance"},
+        {"$project": {
+            "_id": 0,
+            "user_id": 1,
+            "username": 1,
+            "full_name": 1,
+            "email": 1,
+            "date": "$attendance.date",
+            "time_in": "$attendance.time_in",
+            "status": "$attendance.status",
+            "image": "$attendance.image",
+            "image_state": "$attendance.image_state",
+        }},
+    ]
+
+
+async def _no_rows():
+    return
+    yield
+
+
+async def stream_report(cursor, report_format: ReportFormat):
+    """
+    Render report rows from a cursor as CSV or NDJSON chunks.
+
+    Rows are consumed as the cursor fetches them in batches and flushed once the
+    buffer reaches `REPORT_STREAM_CHUNK_SIZE`, so memory stays flat regardless of
+    the report's size.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=REPORT_FIELDS, extrasaction="ignore")
+    if report_format == ReportFormat.CSV:
+        writer.writeheader()
+
+    async for row in cursor:
+        if report_format == ReportFormat.CSV:
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(row, default=str))
+            buffer.write("\n")
+        if buffer.tell() >= REPORT_STREAM_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+@routes.get("/attendance", response_description="Stream an attendance report")
+async def attendance_report(
+    start_date: date,
+    end_date: date,
+    staff_id: Optional[str] = None,
+    attendance_status: Optional[str] = Query(None, alias="status"),
+    report_format: ReportFormat = Query(ReportFormat.CSV, alias="format"),
+    manager: Dict = Depends(get_current_active_manager)
+):
+    """
+    Export attendance for the staff managed by the current manager.
+
+    Results can be filtered by date range, staff member and status, and are
+    streamed as CSV or NDJSON straight from the aggregation cursor.
+    """
+    if end_date < start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end_date must not be before start_date."
+        )
+    if staff_id and not ObjectId.is_valid(staff_id):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid staff ID."
+        )
+
+    # Only clock-ins are recorded, so any status other than "Present" is an empty report
+    if attendance_status and attendance_status != PRESENT:
+        cursor = _no_rows()
+    else:
+        pipeline = attendance_report_pipeline(str(manager.get("_id")), start_date, end_date, staff_id)
+        cursor = user_collection.aggregate(pipeline, batchSize=REPORT_CURSOR_BATCH_SIZE)
+
+    media_type = "text/csv" if report_format == ReportFormat.CSV else "application/x-ndjson"
+    filename = f"attendance_{start_date.isoformat()}_{end_date.isoformat()}.{report_format.value}"
+    return StreamingResponse(
+        stream_report(cursor, report_format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@routes.get("/dashboard", response_description="Daily attendance rollups")
+async def attendance_dashboard(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    manager: Dict = Depends(get_current_active_manager)
+):
+    """
+    Return the current manager's daily attendance rollups.
+
+    Counts are read from the incrementally maintained rollups collection, one
+    document per (date, shift), instead of scanning raw attendance. Defaults to
+    today when no dates are given.
+    """
+    start_date = start_date or date.today()
+    end_date = end_date or start_date
+    if end_date < start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end_date must not be before start_date."
+        )
+
+    rollups = await rollup_collection.find(
+        {
+            "manager_id": str(manager.get("_id")),
+            "date": {"$gte": start_date.isoformat(), "$lte": end_date.isoformat()},
+        },
+        {"_id": 0, "manager_id": 0},
+    ).sort([("date", 1), ("shift_name", 1)]).to_list(None)
+
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "present": sum(rollup["present"] for rollup in rollups),
+        "late": sum(rollup["late"] for rollup in rollups),
+        "rollups": rollups,
+    }
@@ -1,28 +1,37 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from models.shifts import Shifts
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from models.shifts import Shifts, ShiftAssignment, ShiftDetails, ShiftRegistration
 from Utils.OAuth import get_current_user
+from Utils.HttpCache import cache_headers, has_validators, make_etag, not_modified
+from Utils.ShiftCalendar import SCHEDULE_FIELDS, SHIFT_WINDOWS, shift_calendar
 from database.database_connection import shift_collection, user_collection
-from pymongo import ReturnDocument
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from typing import List, Optional
+from datetime import date
 from bson import ObjectId
+import logging
 import time
 
 routes = APIRouter()
+logger = logging.getLogger("attendance.shifts")
 
-def validate_shift_times(shift_name: str, start_time: str, end_time: str):
-    # Define the valid start and end times for each shift
-    valid_times = {
-        "morning": ("08:00", "16:00"),
-        "afternoon": ("12:00", "21:00"),
-        "evening": ("16:00", "03:00"),
-        "night": ("21:00", "06:00")
-    }
+# Fields returned to clients for a shift; `_id` is kept so callers can tell
+# inserts from updates and dropped before responding.
+SHIFT_PROJECTION = {
+    "user_id": 1, **{field: 1 for field in SCHEDULE_FIELDS},
+    "created_at": 1, "updated_at": 1,
+}
+
+# Longest rotation cycle a shift may have, in days.
+MAX_ROTATION_DAYS = 56
 
+def validate_shift_times(shift_name: str, start_time: str, end_time: str):
     # Convert shift_name to lowercase to ensure case-insensitive matching
     shift_name_lower = shift_name.lower()
 
     # Check if the shift_name is valid and if the start_time and end_time match the expected values
-    if shift_name_lower in valid_times:
-        expected_start_time, expected_end_time = valid_times[shift_name_lower]
+    if shift_name_lower in SHIFT_WINDOWS:
+        expected_start_time, expected_end_time = SHIFT_WINDOWS[shift_name_lower]
         if start_time != expected_start_time or end_time != expected_end_time:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -33,8 +42,68 @@ def validate_shift_times(shift_name: str, start_time: str, end_time: str):
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid shift name"
         )
-    
-@routes.patch("", response_description="Shift register")
+
+def validate_schedule(weekdays: Optional[List[int]], rotation: Optional[list], rotation_start: Optional[date]):
+    """
+    Check the optional weekly and rotating parts of a shift schedule.
+
+    `weekdays` must name at least one day (0 is Monday, 6 is Sunday). A
+    `rotation` lists the shift worked on each day of a repeating cycle, null
+    for a day off; it needs at least one working day, at most
+    `MAX_ROTATION_DAYS` entries and a `rotation_start` date for day one.
+    """
+    if weekdays is not None and (not weekdays or any(day not in range(7) for day in weekdays)):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="weekdays must list days from 0 (Monday) to 6 (Sunday)"
+        )
+    if rotation is None:
+        if rotation_start is not None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="rotation_start is only allowed with a rotation"
+            )
+        return
+    if not any(rotation) or len(rotation) > MAX_ROTATION_DAYS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A rotation must have 1 to {MAX_ROTATION_DAYS} days with at least one shift"
+        )
+    if rotation_start is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="rotation_start is required with a rotation"
+        )
+
+def shift_etag(user_id: str, shift: dict) -> str:
+    return make_etag("shift", user_id, shift.get("version", 0), shift.get("updated_at"))
+
+def shift_upsert(staff_id: str, shiftPayload: Shifts, now: int):
+    """
+    Build the filter and update document that upsert a staff member's shift.
+
+    The filter matches the staff member's shift only when at least one field
+    differs from the payload. Every write increments `version`, which the
+    shift's ETag is derived from. Returns the filter, the update and the `_id`
+    a newly inserted shift will get, so callers can tell inserts from updates.
+    """
+    shift_fields = shiftPayload.model_dump(mode="json", include=set(SCHEDULE_FIELDS))
+    new_shift_id = ObjectId()
+    shift_filter = {
+        "user_id": staff_id,
+        "$or": [{field: {"$ne": value}} for field, value in shift_fields.items()],
+    }
+    shift_update = {
+        "$set": {**shift_fields, "updated_at": now},
+        "$inc": {"version": 1},
+        "$setOnInsert": {"_id": new_shift_id, "user_id": staff_id, "created_at": now},
+    }
+    return shift_filter, shift_update, new_shift_id
+
+@routes.patch(
+    "", response_description="Shift register",
+    response_model=ShiftRegistration, response_model_exclude_none=True,
+)
 async def shift_register(
     shiftPayload: Shifts, 
     staff_id: str,  # The ID of the staff whose shift is being updated
@@ -52,9 +121,11 @@ async def shift_register(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only managers are allowed to change shifts"
         )
-    print(staff_id)
+    logger.debug("Registering shift", extra={"manager_id": manager_id, "staff_id": staff_id})
     # Retrieve the staff member's data
-    staff_member = user_collection.find_one({"_id": ObjectId(staff_id), "role": "staff"})
+    staff_member = await user_collection.find_one(
+        {"_id": ObjectId(staff_id), "role": "staff"}, {"manager_id": 1}
+    )
 
     if not staff_member:
         raise HTTPException(
@@ -71,68 +142,164 @@ async def shift_register(
 
     # Validate the shift times based on the shift name
     validate_shift_times(shiftPayload.shift_name, shiftPayload.start_time, shiftPayload.end_time)
+    validate_schedule(shiftPayload.weekdays, shiftPayload.rotation, shiftPayload.rotation_start)
 
-    # Set the current time as the updated_at timestamp
-    shiftPayload.updated_at = int(time.time())
+    # Upsert in one round-trip. The filter only matches a shift that differs from
+    # the payload, so an unchanged shift falls through to the insert branch of the
+    # upsert and is rejected by the unique user_id index.
+    shift_filter, shift_update, new_shift_id = shift_upsert(staff_id, shiftPayload, int(time.time()))
+    try:
+        shift = await shift_collection.find_one_and_update(
+            shift_filter,
+            shift_update,
+            upsert=True,
+            projection=SHIFT_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="Shift already exists"
+        )
+    shift_calendar.invalidate(staff_id)
 
-    # Check if a shift for the staff member already exists
-    existing_shift = shift_collection.find_one({"user_id": staff_id})
+    if not shift:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Failed to update shift. Please try again."
+        )
+    if shift["_id"] == new_shift_id:
+        return {"msg": "Successfully inserted shift", "shift_id": str(new_shift_id)}
+    shift.pop("_id")
+    return {"msg": "Successfully updated shift", "shift": shift}
+        
+@routes.patch("/bulk", response_description="Bulk shift assignment")
+async def shift_register_bulk(
+    assignments: List[ShiftAssignment],
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Register or update the shifts of many staff members at once.
 
-    if existing_shift:
-        # Remove the '_id' field for comparison
-        existing_shift.pop("_id", None)
+    Ownership of every staff member is verified with one query, each distinct
+    shift is validated once and all changes are applied with a single unordered
+    `bulk_write` of upserts. Returns an outcome per assignment: inserted,
+    updated, unchanged or an error.
+    """
+    manager_id = str(current_user.get("_id"))
 
-        # If the new shift details are the same as the existing ones, return a conflict
-        if shiftPayload.dict() == existing_shift:
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT, detail="Shift already exists"
-            )
-        shiftPayload = shiftPayload.dict()
-        shiftPayload["user_id"] = staff_id
-        # Update the existing shift with the new details
-        updated_shift = shift_collection.find_one_and_update(
-            {"user_id": staff_id},
-            {"$set": shiftPayload},
-            return_document=ReturnDocument.AFTER
+    if current_user.get("role") != "manager":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only managers are allowed to change shifts"
         )
-        updated_shift.pop("_id")
-        if updated_shift:
-            return {"msg": "Successfully updated shift", "shift": updated_shift}
+
+    results = [None] * len(assignments)
+    pending = {}
+    seen = set()
+    for index, assignment in enumerate(assignments):
+        if not ObjectId.is_valid(assignment.staff_id):
+            results[index] = {"staff_id": assignment.staff_id, "status": "error", "detail": "Invalid staff ID"}
+        elif assignment.staff_id in seen:
+            results[index] = {"staff_id": assignment.staff_id, "status": "error", "detail": "Duplicate staff ID in request"}
         else:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Failed to update shift. Please try again."
-            )
-    else:
-        # Set the current time as the created_at timestamp for a new shift
-        shiftPayload.created_at = int(time.time())
-        shiftPayload.user_id = staff_id
-
-        # Insert the new shift
-        shift_response = shift_collection.insert_one(shiftPayload.dict())
-        if shift_response.inserted_id:
-            return {"msg": "Successfully inserted shift", "shift_id": str(shift_response.inserted_id)}
+            pending[index] = assignment
+        seen.add(assignment.staff_id)
+
+    # One query for every staff member in the request
+    staff_members = {
+        str(staff["_id"]): staff
+        async for staff in user_collection.find(
+            {"_id": {"$in": [ObjectId(a.staff_id) for a in pending.values()]}, "role": "staff"},
+            {"manager_id": 1},
+        )
+    }
+
+    # Validate each distinct shift definition once
+    shift_errors = {}
+    for shift in {(a.shift_name, a.start_time, a.end_time) for a in pending.values()}:
+        try:
+            validate_shift_times(*shift)
+        except HTTPException as e:
+            shift_errors[shift] = e.detail
+
+    for index, assignment in list(pending.items()):
+        staff_member = staff_members.get(assignment.staff_id)
+        shift_error = shift_errors.get((assignment.shift_name, assignment.start_time, assignment.end_time))
+        if not shift_error:
+            try:
+                validate_schedule(assignment.weekdays, assignment.rotation, assignment.rotation_start)
+            except HTTPException as e:
+                shift_error = e.detail
+        if not staff_member:
+            detail = "Staff member not found"
+        elif staff_member.get("manager_id") != manager_id:
+            detail = "You are not authorized to change this staff member's shift"
+        elif shift_error:
+            detail = shift_error
         else:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Failed to insert shift. Please try again."
+            continue
+        results[index] = {"staff_id": assignment.staff_id, "status": "error", "detail": detail}
+        del pending[index]
+
+    if pending:
+        now = int(time.time())
+        indexes = list(pending)
+        operations = []
+        for index in indexes:
+            assignment = pending[index]
+            shift_filter, shift_update, _ = shift_upsert(
+                assignment.staff_id, Shifts(**assignment.dict(exclude={"staff_id"})), now
             )
-        
-@routes.get("/", response_description="Current shift")
-async def get_current_shift(current_user: dict = Depends(get_current_user)):
+            operations.append(UpdateOne(shift_filter, shift_update, upsert=True))
+
+        # Unchanged shifts fall through to an upsert insert and are rejected by the
+        # unique user_id index, exactly like the single-staff endpoint
+        try:
+            result = await shift_collection.bulk_write(operations, ordered=False)
+            upserted, errors = set(result.upserted_ids), {}
+        except BulkWriteError as e:
+            upserted = {item["index"] for item in e.details.get("upserted", [])}
+            errors = {error["index"]: error for error in e.details.get("writeErrors", [])}
+
+        for position, index in enumerate(indexes):
+            staff_id = pending[index].staff_id
+            shift_calendar.invalidate(staff_id)
+            error = errors.get(position)
+            if error is None:
+                outcome = "inserted" if position in upserted else "updated"
+                results[index] = {"staff_id": staff_id, "status": outcome}
+            elif error.get("code") == 11000:
+                results[index] = {"staff_id": staff_id, "status": "unchanged"}
+            else:
+                results[index] = {"staff_id": staff_id, "status": "error", "detail": "Failed to update shift. Please try again."}
+
+    return {"results": results}
+
+@routes.get("/", response_description="Current shift", response_model=ShiftDetails)
+async def get_current_shift(request: Request, response: Response, current_user: dict = Depends(get_current_user)):
     """
         Retrieve the current shift details for the authenticated user.
 
         This endpoint fetches the shift information for the currently logged-in user
         based on their user ID. If no shift is found, a 404 error is returned.
+
+        The response carries an ETag and Last-Modified. A request with a
+        matching If-None-Match (or If-Modified-Since) gets an empty 304 after
+        reading only the shift's version fields.
     """
     user_id = str(current_user.get("_id"))
-    
-    existing_shift = shift_collection.find_one({"user_id": user_id})
+
+    if has_validators(request):
+        version = await shift_collection.find_one({"user_id": user_id}, {"_id": 0, "version": 1, "updated_at": 1})
+        if version:
+            cached = not_modified(request, shift_etag(user_id, version), version.get("updated_at"))
+            if cached is not None:
+                return cached
+
+    existing_shift = await shift_collection.find_one({"user_id": user_id}, {**SHIFT_PROJECTION, "version": 1, "_id": 0})
     
     if not existing_shift:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No shift found.")
-    
-    existing_shift.pop("_id", None)
-    
-    return existing_shift
\ No newline at end of file
+
+    response.headers.update(cache_headers(shift_etag(user_id, existing_shift), existing_shift.get("updated_at")))
+    return existing_shift